@@ -6,9 +6,23 @@ Description: Python GUI for controlling several serial devices.
 """
 
 import os
+import sys
 import Command_Line_Arguments
 import Device_Configuration
-import Monitor_Window
+
+
+def exit_with_configurations(message: str, configurations: Device_Configuration.DeviceConfiguration):
+    """Prints an error about the requested configuration and the names of the available ones, then exits.
+
+    :param message: str
+        The error to print.
+    :param configurations: DeviceConfiguration
+        The known configurations."""
+    print(message)
+    names = '\n'.join(f"    {name}" for name in configurations.keys())
+    print('Available configurations:\n' + names)
+    exit(1)
+
 
 if __name__ == '__main__':
     # Project assumes running directory to be project root, refuses to run if not.
@@ -20,20 +34,27 @@ if __name__ == '__main__':
             "to cd or set the working directory properly and re-run.")
         exit(1)
 
-    parser = Command_Line_Arguments.solar_simulator_monitor_argparser()
-    args = parser.parse_args()
+    # Fast path for the common '-c NAME' invocation, argparse is only needed for anything else.
+    if len(sys.argv) == 3 and sys.argv[1] in ('-c', '--configuration'):
+        configuration_name = sys.argv[2]
+    else:
+        parser = Command_Line_Arguments.solar_simulator_monitor_argparser()
+        configuration_name = parser.parse_args().configuration
     configurations = Device_Configuration.DeviceConfiguration()
     configuration = None
-    if args.configuration:
+    if configuration_name:
         try:
-            configuration = configurations[args.configuration]
+            configuration = configurations.get(configuration_name)
         except KeyError as e:
-            print(e)
-            print('Available configurations:')
-            for name in configurations.keys():
-                print(f"    {name}")
-            exit(1)
-    else:
+            # A device of the configuration is not in the known devices list.
+            exit_with_configurations(e.args[0], configurations)
+        if configuration is None:
+            exit_with_configurations(f"The name '{configuration_name}' is not associated with any configuration.",
+                                     configurations)
+
+    # The GUI is only imported once the requested configuration is known to exist.
+    import Monitor_Window
+    if configuration is None:
         available_configurations = list(configurations.keys())
         device_choice_window = Monitor_Window.MultipleChoiceWindow(available_configurations)
         device_choice_window.mainloop()
@@ -7,6 +7,9 @@ Description: Part of the GUI to monitor and control the solar simulator setup in
 
 import tkinter as tk
 from tkinter import ttk
+from contextlib import contextmanager
+import weakref
+import numpy as np
 
 import Schedule
 
@@ -41,6 +44,7 @@ class AutomationWindow(tk.Toplevel):
         self._menu_file.add_command(label='Stop', command=self.stop_schedule)
         self._menu_file.add_command(label='Reset', command=self.reset_schedule)
         self._menu_file.add_command(label='Add entry', command=self.add_row)
+        self._menu_file.add_command(label='Remove selected', command=self.remove_selected_rows)
         self._menu_bar.add_cascade(label='Schedule', menu=self._menu_file, underline=0)
         if schedule.running:
             self._menu_file.entryconfig('Start', state='disabled')
@@ -48,28 +52,63 @@ class AutomationWindow(tk.Toplevel):
             self._menu_file.entryconfig('Stop', state='disabled')
 
         self._main_frame = ttk.Frame(master=self)
-        self._main_frame.pack()
+        self._main_frame.pack(fill=tk.BOTH, expand=True)
         self._bottom_frame = ttk.Frame(master=self)
         self._bottom_frame.pack()
         self._message_to_user = ttk.Label(master=self._bottom_frame, text='')
         self._message_to_user.pack()
 
-        column = 0
-        headers = ['Action'] + [parameter.description for parameter in schedule.parameters]
+        # All rows live in a single Treeview, a floating Entry is placed over the cell being edited.
+        self._parameters = tuple(schedule.parameters)
+        headers = [parameter.description for parameter in self._parameters]
+        # Parameters the user can edit, the column they are shown in and whether they are numeric.
+        self._editable_params = tuple(parameter for parameter in self._parameters if not parameter.read_only)
+        self._editable_columns = tuple(self._parameters.index(parameter) for parameter in self._editable_params)
+        self._numeric_mask = tuple(parameter.numeric for parameter in self._editable_params)
+        self._numeric_columns = tuple(column for column, numeric in zip(self._editable_columns, self._numeric_mask)
+                                      if numeric)
+        self.status_column = self._parameters.index(schedule.parameter_status)
+        self._tree = ttk.Treeview(master=self._main_frame, columns=headers, show='headings', selectmode='extended')
         for title in headers:
-            header_label = ttk.Label(master=self._main_frame, text=title)
-            header_label.grid(column=column, row=0, padx=10, pady=3)
-            column += 1
+            self._tree.heading(title, text=title)
+            self._tree.column(title, anchor=tk.CENTER, width=max(100, self._entry_font.measure(title) + 20))
+        self._tree_scrollbar = ttk.Scrollbar(master=self._main_frame, orient=tk.VERTICAL, command=self._tree.yview)
+        self._tree.configure(yscrollcommand=self._tree_scrollbar.set)
+        self._tree.grid(column=0, row=0, columnspan=2, sticky='NSEW', padx=1, pady=3)
+        self._tree_scrollbar.grid(column=2, row=0, sticky='NS', pady=3)
+        self._main_frame.columnconfigure(index=0, weight=1)
+        self._main_frame.rowconfigure(index=0, weight=1)
+        self._tree.bind('<Double-1>', self._begin_edit)
+        self._tree.bind('<Delete>', lambda event: self.remove_selected_rows())
+
+        self._editor = ttk.Entry(master=self._tree, font=self._entry_font)
+        self._editor.bind('<Return>', self._commit_edit)
+        self._editor.bind('<FocusOut>', self._commit_edit)
+        self._editor.bind('<Escape>', self._cancel_edit)
+        self._editor_cell = None  # (row, column index) of the cell being edited, None if not editing.
 
         self.rows = []
 
+        # Row values are staged here and written to the Treeview once per batch of updates.
+        self._pending = {}
+        self._batch_depth = 0
+        self._dirty = False
+        # Updates outside a batch (e.g. from the schedule thread) are coalesced to at most one redraw per interval.
+        self._max_refresh_hz = 10
+        self._refresh_interval_ms = int(1000 / self._max_refresh_hz)
+        self._refresh_pending = False
+        self._refresh_job = None
+
         self._button_addrow = ttk.Button(master=self._main_frame, text='Add', command=self.add_row)
-        self._button_addrow.grid(column=0, row=1, padx=1, pady=3)
+        self._button_addrow.grid(column=0, row=1, padx=1, pady=3, sticky='E')
+        self._button_removerow = ttk.Button(master=self._main_frame, text='Remove', command=self.remove_selected_rows)
+        self._button_removerow.grid(column=1, row=1, padx=1, pady=3, sticky='W')
 
-        for run_parameters in self._schedule:
-            self.add_row(run_parameters)
-        if len(self.rows) == 0:
-            self.add_row()
+        with self._batch_updates():
+            for run_parameters in self._schedule:
+                self.add_row(run_parameters)
+            if len(self.rows) == 0:
+                self.add_row()
 
     def destroy(self):
         """Override parent destroy function to update schedule."""
@@ -78,6 +117,9 @@ class AutomationWindow(tk.Toplevel):
         except (KeyError, ValueError) as e:
             self._message_to_user.configure(text=str(e))
         else:
+            if self._refresh_job:
+                self.after_cancel(self._refresh_job)
+                self._refresh_job = None
             self._schedule.automation_window = None
             super().destroy()
 
@@ -95,10 +137,12 @@ class AutomationWindow(tk.Toplevel):
 
     def reset_schedule(self):
         """Resets the schedule (all rows to 'ready'), so that it can be run again."""
-        for run_condition in self._schedule:
-            run_condition[self._schedule.parameter_status] = 'ready'
-        for row in self.rows:
-            row.label_status.configure(text='ready')
+        with self._batch_updates():
+            for run_condition in self._schedule:
+                run_condition[self._schedule.parameter_status] = 'ready'
+            # Only the status changes, unsaved edits in the other columns are kept.
+            for row in self.rows:
+                row.set_value(self.status_column, 'ready')
 
     def enable_start(self, enable):
         """Enables the schedule start buttons.
@@ -117,13 +161,20 @@ class AutomationWindow(tk.Toplevel):
     def update_fields_to_schedule(self):
         """Reads all data from the window and updates the internal schedule object accordingly. Must be called to
         ensure data entered by the user is not lost on exiting the window or when running the schedule."""
-        for row in self.rows:
-            if not row._schedule_row:
-                self._schedule.append()
-                row._schedule_row = self._schedule[-1]
-            row.update_to_schedule()
-        while len(self._schedule) > WindowRow.MAX_INDEX:
-            self._schedule.pop()
+        self._commit_edit()
+        with self._batch_updates():
+            for row in self.rows:
+                if not row._schedule_row:
+                    self._schedule.append()
+                    row._schedule_row = self._schedule[-1]
+            # Numeric fields of the whole table are parsed at once, raises ValueError if any is not a number.
+            rows = [row for row in self.rows if not row.empty()]
+            numeric_values = np.array([[row.values[column] for column in self._numeric_columns] for row in rows],
+                                      dtype=np.float64).reshape(len(rows), len(self._numeric_columns))
+            for row, row_numeric_values in zip(rows, numeric_values.tolist()):
+                row.update_to_schedule(row_numeric_values)
+            while len(self._schedule) > len(self.rows):
+                self._schedule.pop()
 
     def add_row(self, run_parameters: Schedule.ScheduleRow = None):
         """Adds a row of parameters.
@@ -136,19 +187,121 @@ class AutomationWindow(tk.Toplevel):
         new_row = WindowRow(parent=self, run_parameters=run_parameters)
         self.rows.append(new_row)
 
+    def remove_selected_rows(self):
+        """Removes the rows currently selected in the window, along with the corresponding schedule rows."""
+        self._cancel_edit()
+        for iid in self._tree.selection():
+            row = self._find_row(iid)
+            if row:
+                index = row.index
+                row.remove()
+                self._schedule.pop(index)
+
     def get_row(self, index: int):
         """Return the row with the requested index.
 
         :param index: int
             The index of the row (starting at 0)."""
+        if 0 <= index < len(self.rows):
+            return self.rows[index]
+
+    def _find_row(self, iid: str):
+        """Return the row shown by a Treeview item.
+
+        :param iid: str
+            Identifier of the Treeview item."""
         for row in self.rows:
-            if row.index == index:
+            if row.iid == iid:
                 return row
 
+    @contextmanager
+    def _batch_updates(self):
+        """Context in which row updates are only staged, the window is refreshed once when the outermost context
+        exits. Can be nested."""
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._dirty:
+                self._refresh()
+
+    def _refresh(self):
+        """Writes all staged row values to the Treeview and redraws the window."""
+        pending, self._pending = self._pending, {}
+        self._dirty = False
+        for iid, values in pending.items():
+            if self._tree.exists(iid):
+                self._tree.item(iid, values=values)
+        self.update_idletasks()
+
+    def _request_refresh(self):
+        """Schedules a refresh of the window, unless one is already scheduled."""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self._refresh_job = self.after(self._refresh_interval_ms, self._do_refresh)
+
+    def _do_refresh(self):
+        """Performs a scheduled refresh of the window."""
+        self._refresh_pending = False
+        self._refresh_job = None
+        if self._dirty:
+            self._refresh()
+
+    def set_row_values(self, iid: str, values):
+        """Stages new values for a row of the Treeview. Within a batch of updates the window is refreshed when the
+        batch ends, otherwise a refresh is scheduled (at most self._max_refresh_hz per second).
+
+        :param iid: str
+            Identifier of the Treeview item.
+        :param values: tuple
+            The values to show, one per schedule parameter."""
+        self._pending[iid] = values
+        self._dirty = True
+        if self._batch_depth == 0:
+            self._request_refresh()
+
+    def _begin_edit(self, event):
+        """Places the editing field over the cell which was double-clicked."""
+        self._commit_edit()
+        iid = self._tree.identify_row(event.y)
+        column = self._tree.identify_column(event.x)
+        row = self._find_row(iid)
+        if not row or not column:
+            return
+        column_index = int(column[1:]) - 1
+        if self._parameters[column_index].read_only:
+            return
+        bbox = self._tree.bbox(iid, column)
+        if not bbox:
+            return
+        x, y, width, height = bbox
+        self._editor_cell = (row, column_index)
+        self._editor.delete(0, tk.END)
+        self._editor.insert(0, row.values[column_index])
+        self._editor.place(x=x, y=y, width=width, height=height)
+        self._editor.focus_set()
+        self._editor.select_range(0, tk.END)
+
+    def _commit_edit(self, event=None):
+        """Writes the content of the editing field to the cell being edited and hides the field."""
+        if self._editor_cell:
+            row, column_index = self._editor_cell
+            if row in self.rows:
+                with self._batch_updates():
+                    row.set_value(column_index, self._editor.get())
+        self._cancel_edit()
+
+    def _cancel_edit(self, event=None):
+        """Hides the editing field, discarding its content."""
+        self._editor_cell = None
+        self._editor.place_forget()
+
 
 class WindowRow:
-    """Collects all elements within a row of fields within the Automation Window."""
-    MAX_INDEX = 0
+    """Links an item (row) of the Treeview within the Automation Window to a row of the schedule.
+    The values are stored in the Treeview item, a row holds no widgets of its own."""
+    __slots__ = ('_iid', '_parent', '_schedule_row', '_values')
 
     def __init__(self, parent: AutomationWindow, run_parameters: Schedule.ScheduleRow):
         """Adds a window row to the parent AutomationWindow.
@@ -157,68 +310,74 @@ class WindowRow:
             The Automation window that this row belongs to.
         :param run_parameters: Schedule.ScheduleRow
             The row in the schedule data this row is linked to."""
-        self._row_index = WindowRow.MAX_INDEX
-        WindowRow.MAX_INDEX += 1
-
-        self._parent = parent
+        self._parent = weakref.proxy(parent)  # The window owns its rows, avoid a reference cycle.
         self._schedule_row = run_parameters
-        column = 0
+        self._values = ()  # The values shown in the Treeview, as strings, one per schedule parameter.
 
-        parent._button_addrow.grid(column=0, row=WindowRow.MAX_INDEX+1, padx=1, pady=3)
-
-        self.button_remove = ttk.Button(master=parent._main_frame, text='Remove', command=self.remove)
-        self.button_remove.grid(column=column, row=self._row_index+1, padx=1, pady=3)
-        column += 1
-
-        self.label_status = ttk.Label(master=parent._main_frame, text='ready')
-        self.label_status.grid(column=column, row=self._row_index+1, padx=1, pady=3)
-        column += 1
-
-        self.fields = {}
-        for parameter in self._schedule_row.keys():
-            if not parameter.read_only:
-                field = ttk.Entry(master=parent._main_frame, font=parent._entry_font)
-                field.grid(column=column, row=self._row_index+1, padx=1, pady=3)
-                self.fields[parameter] = field
-                column += 1
+        self._iid = parent._tree.insert('', tk.END)
 
         self.update_from_schedule()
 
     @property
     def index(self):
-        return self._row_index
+        """Position of this row within the parent window (and schedule)."""
+        return self._parent.rows.index(self)
+
+    @property
+    def iid(self):
+        """Identifier of the Treeview item showing this row."""
+        return self._iid
+
+    @property
+    def values(self) -> tuple:
+        """The values shown in this row, as strings, one per schedule parameter."""
+        return self._values
+
+    def set_value(self, column_index: int, value: str):
+        """Changes a single value shown in this row (the schedule is not affected until update_to_schedule).
+
+        :param column_index: int
+            Index of the schedule parameter.
+        :param value: str
+            The new value."""
+        values = list(self._values)
+        values[column_index] = value
+        self._values = tuple(values)
+        self._parent.set_row_values(self._iid, self._values)
 
     def empty(self):
         """Is the row completely empty?
 
         :return: bool
             Returns true if the row is empty."""
-        return all(field.get() == '' for field in self.fields.values())
+        values = self._values
+        return not any(values[column] for column in self._parent._editable_columns)
 
     def update_from_schedule(self):
         """Populates this row with data from the corresponding row on the schedule."""
-        for parameter in self._schedule_row.keys():
-            if not parameter.read_only:
-                self.fields[parameter].delete(0, tk.END)
-                value = self._schedule_row[parameter]
-                if value:
-                    self.fields[parameter].insert(0, value)
-        self.label_status.configure(text=self._schedule_row['Status'])
-
-    def update_to_schedule(self):
-        """Transfers all info in this row to the corresponding row on the schedule."""
+        schedule_row = self._schedule_row
+        self._values = tuple('' if value is None else str(value)
+                             for value in (schedule_row[parameter] for parameter in self._parent._parameters))
+        self._parent.set_row_values(self._iid, self._values)
+
+    def update_to_schedule(self, numeric_values: list = None):
+        """Transfers all info in this row to the corresponding row on the schedule.
+
+        :param numeric_values: list
+            Optional, the numeric fields of this row already converted to float (in column order). If not given,
+            the fields are converted here."""
         if self._schedule_row and not self.empty():
-            for parameter in self.fields.keys():
-                value = self.fields[parameter].get()
-                if parameter.numeric:
-                    value = float(value)
-                self._schedule_row[parameter] = value
+            parent = self._parent
+            values = self._values
+            if numeric_values is None:
+                numeric_values = [float(values[column]) for column in parent._numeric_columns]
+            numeric_values = iter(numeric_values)
+            for parameter, column, numeric in zip(parent._editable_params, parent._editable_columns,
+                                                  parent._numeric_mask):
+                self._schedule_row[parameter] = next(numeric_values) if numeric else values[column]
 
     def remove(self):
         """Remove this row from the window."""
-        self.button_remove.destroy()
-        self.label_status.destroy()
-        for field in self.fields.values():
-            field.destroy()
-        WindowRow.MAX_INDEX -= 1
-        self._parent._button_addrow.grid(column=0, row=WindowRow.MAX_INDEX+1, padx=1, pady=3)
+        self._parent._pending.pop(self._iid, None)
+        self._parent._tree.delete(self._iid)
+        self._parent.rows.remove(self)
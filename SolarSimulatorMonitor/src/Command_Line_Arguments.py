@@ -6,9 +6,17 @@ Description: Command line arguments for solar simulator monitor.
 """
 
 import argparse
+import functools
+
 
 def solar_simulator_monitor_argparser():
     """Returns the ArgumentParser object for the solar simulator monitor."""
+    return _build_parser()
+
+
+@functools.lru_cache(maxsize=1)
+def _build_parser():
+    """Builds the ArgumentParser object for the solar simulator monitor, only once."""
     parser = argparse.ArgumentParser(prog='Solar Simulator Monitor',
                                      description="""Solar Simulator Monitor is a visual tool to control the 
         various devices which make up the Solar Simulator setup interactively or by setting a schedule for different 
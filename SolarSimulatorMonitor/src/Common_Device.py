@@ -5,6 +5,8 @@ GitHub: https://github.com/simone16
 Description: Base class for all devices that the solar simulator monitor interfaces with.
 """
 
+from contextlib import contextmanager
+from functools import cached_property
 from Default_Logger import print_message
 
 
@@ -89,9 +91,40 @@ class MonitorDevice:
             Returns True if the device is on."""
         return False
 
+    @contextmanager
+    def batch_writes(self):
+        """Context manager, devices which support it send the writes made within the context together when it exits.
+        Reads are not delayed, so do not read values written within the same context."""
+        yield
+
+    @property
+    def generic_name(self) -> str:
+        """Human readable name for the device type e.g.: Temperature controller."""
+        return self._generic_name
+
+    @generic_name.setter
+    def generic_name(self, generic_name: str):
+        self._generic_name = generic_name
+        self._invalidate_name()
+
     @property
+    def specific_name(self) -> str:
+        """Identifier for a specific device, useful if more of the same type are connected."""
+        return self._specific_name
+
+    @specific_name.setter
+    def specific_name(self, specific_name: str):
+        self._specific_name = specific_name
+        self._invalidate_name()
+
+    def _invalidate_name(self) -> None:
+        """Discards the cached complete_name, so that it is computed again on the next access."""
+        self.__dict__.pop('complete_name', None)
+
+    @cached_property
     def complete_name(self) -> str:
         """Combination of generic and specific name.
+        Computed once and cached until generic_name or specific_name change.
 
         :return: str
             A long name with both device generic and specific names."""
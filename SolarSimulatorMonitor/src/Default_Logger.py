@@ -5,23 +5,38 @@ GitHub: https://github.com/simone16
 Description: Defines a default logger function.
 """
 
+import sys
 import time
+from threading import Lock
 
+# The timestamp is only formatted again when the second changes, devices may log from several threads.
+_timestamp_lock = Lock()
+_cached_second = -1
+_cached_timestamp = ''
 
-def print_message(message: str, **kwargs):
+
+def timestamp() -> str:
+    """Current local time formatted as HH:MM:SS.
+
+    :return: str
+        The formatted time."""
+    global _cached_second, _cached_timestamp
+    now = int(time.time())
+    with _timestamp_lock:
+        if now != _cached_second:
+            _cached_timestamp = time.strftime('%H:%M:%S', time.localtime(now))
+            _cached_second = now
+        return _cached_timestamp
+
+
+def print_message(message: str, *, error: bool = False):
     """Print a message to the console.
     This is a wrapper to enable classes of the solar simulator monitor to use the same parameters for printing messages
     to the console or to the Monitor_Window logging area.
 
     :param message: str
         The message to be given to the user.
-    :param kwargs:
-        See below.
-
-    :Keyword Arguments:
-        * error (``bool``) --
-          If true the message will be highlighted as an error."""
-    message = f"{time.strftime('%H:%M:%S')} {message}\n"
-    if ('error' in kwargs.keys()) and kwargs['error']:
-        message = '[ERROR] ' + message
-    print(message)
+    :param error: bool
+        If true the message will be highlighted as an error."""
+    prefix = '[ERROR] ' if error else ''
+    sys.stdout.write(f"{prefix}{timestamp()} {message}\n")
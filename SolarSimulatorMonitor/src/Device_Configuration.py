@@ -5,11 +5,9 @@ GitHub: https://github.com/simone16
 Description: Load and store different hardware configurations for the Solar Simulator Setup.
 """
 
-import copy
 import os.path
 from os import getcwd
 import json
-import Serial_devices
 
 
 class DeviceConfiguration:
@@ -23,26 +21,61 @@ class DeviceConfiguration:
     def __init__(self):
         self.path_to_config = os.path.join(getcwd(), 'config', 'device_config.json')
         self._configurations = None
-        self._known_devices = Serial_devices.KnownDevices()
+        self._config_mtime = None  # Modification time of the file when it was last loaded or saved.
+        self._known_devices = None  # Serial_devices.KnownDevices, created when first needed.
+        self._resolved_cache = {}  # Configurations already resolved by __getitem__, by name.
+        self._names_tuple = None  # Configuration names returned by keys(), built once per load.
 
     def load(self):
-        """Retrieves configurations list from file and stores it in this object."""
-        if os.path.isfile(self.path_to_config):
-            with open(self.path_to_config, 'r') as configurations_file:
-                try:
-                    self._configurations = json.load(configurations_file)
-                except json.JSONDecodeError as e:
-                    print(e)
-                    print(f'Unable to open {self.path_to_config}.')
-                    self._configurations = None
-        else:
-            self._configurations = None
+        """Retrieves configurations list from file and stores it in this object.
+        The file is only parsed again if it was modified since the last time it was loaded."""
+        try:
+            mtime = os.stat(self.path_to_config).st_mtime
+        except FileNotFoundError:
+            if self._config_mtime is not None:
+                # The file was removed since it was loaded, otherwise keep whatever was added in memory.
+                self._configurations = None
+                self._config_mtime = None
+                self._resolved_cache = {}
+                self._names_tuple = None
+            return
+        if mtime == self._config_mtime and self._configurations is not None:
+            return
+        self._resolved_cache = {}
+        self._names_tuple = None
+        with open(self.path_to_config, 'r') as configurations_file:
+            try:
+                self._configurations = json.load(configurations_file)
+                self._config_mtime = mtime
+            except json.JSONDecodeError as e:
+                print(e)
+                print(f'Unable to open {self.path_to_config}.')
+                self._configurations = None
+                self._config_mtime = mtime
+
+    def _ensure_loaded(self):
+        """Loads the configurations list from file, unless already loaded and unchanged on disk.
+        If the file is missing or cannot be read, the configurations list is left empty."""
+        self.load()
+        if self._configurations is None:
+            self._configurations = {}
+
+    def _get_known_devices(self):
+        """Returns the known devices object, importing the serial device support on first use.
+
+        :return: Serial_devices.KnownDevices
+            The list of known serial devices."""
+        if self._known_devices is None:
+            import Serial_devices
+            self._known_devices = Serial_devices.KnownDevices()
+        return self._known_devices
 
     def save(self):
         """Overwrites the configuration list with data from this object."""
         if self._configurations:
             with open(self.path_to_config, 'w') as configurations_file:
                 json.dump(self._configurations, configurations_file, indent=4)
+            self._config_mtime = os.stat(self.path_to_config).st_mtime
 
     def add(self, configuration_name: str, device_name: str, device_type: str):
         """Add a device to an existing configuration, or creates a new one if the name does not match any existing
@@ -58,15 +91,14 @@ class DeviceConfiguration:
             Raises an exception if the device type or name is not known."""
         if not device_type in self.DEVICE_TYPE.keys():
             raise KeyError(f"'{device_type}' is not a valid device type.")
-        if not device_name in self._known_devices.keys():
+        if not device_name in self._get_known_devices().keys():
             raise KeyError(f"Device '{device_name}' is not known.")
-        if not self._configurations:
-            self.load()
-            if not self._configurations:
-                self._configurations = {}
-        if configuration_name not in self._configurations.keys():
+        self._ensure_loaded()
+        if configuration_name not in self._configurations:
             self._configurations[configuration_name] = []
         self._configurations[configuration_name].append({'name': device_name, 'type': device_type})
+        self._resolved_cache.pop(configuration_name, None)
+        self._names_tuple = None
 
     def __getitem__(self, configuration_name: str):
         """Returns a list of dictionaries holding information about each device in the selected configuration.
@@ -83,23 +115,44 @@ class DeviceConfiguration:
                     name of the comport the device is connected to, or None if it was not found.
         :raise KeyError:
             Raises an exception if the name is not in the configurations list."""
+        self._ensure_loaded()
         if not self._configurations:
-            self.load()
-            if not self._configurations:
-                raise KeyError('The list of known devices is empty.')
-        if configuration_name in self._configurations.keys():
-            configuration = copy.deepcopy(self._configurations[configuration_name])
-            for device in configuration:
-                device['comport'] = self._known_devices[device['name']]
-            return configuration
-        else:
+            raise KeyError('The list of known devices is empty.')
+        if configuration_name not in self._configurations.keys():
             raise KeyError(f"The name '{configuration_name}' is not associated with any configuration.")
+        if configuration_name not in self._resolved_cache:
+            known_devices = self._get_known_devices()
+            self._resolved_cache[configuration_name] = [{'name': device['name'],
+                                                         'type': device['type'],
+                                                         'comport': known_devices[device['name']]}
+                                                        for device in self._configurations[configuration_name]]
+        return self._resolved_cache[configuration_name]
+
+    def get(self, configuration_name: str, default=None):
+        """Returns the same list as __getitem__, or default if the name is not in the configurations list.
+        Like __getitem__, raises KeyError if a device of the configuration is not a known device.
+
+        :param configuration_name: str
+            The name used to identify the configuration.
+        :param default:
+            The value to return if the configuration is not found.
+        :return: list
+            See __getitem__.
+        :raise KeyError:
+            Raises an exception if a device name is not in the known devices list."""
+        self._ensure_loaded()
+        if configuration_name in self._resolved_cache:
+            return self._resolved_cache[configuration_name]
+        if not self._configurations or configuration_name not in self._configurations:
+            return default
+        return self[configuration_name]
 
     def keys(self):
         """Returns the names of all configurations.
 
-        :return: dict_keys
+        :return: tuple
             Configurations names"""
-        if not self._configurations:
-            self.load()
-        return self._configurations.keys()
+        self._ensure_loaded()
+        if self._names_tuple is None:
+            self._names_tuple = tuple(self._configurations)
+        return self._names_tuple
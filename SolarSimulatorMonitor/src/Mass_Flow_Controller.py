@@ -5,8 +5,13 @@ GitHub: https://github.com/simone16
 Description: Interface to Bronkhorst mass flow controller device (serial-through-USB).
 """
 
+import math
 import propar
-from threading import Lock
+import queue
+import serial
+import time
+from concurrent.futures import Future
+from threading import Lock, Thread
 from Common_Device import MonitorDevice
 
 
@@ -31,37 +36,301 @@ class MassFlowController(MonitorDevice):
         self.has_enable = False
 
         self._instrument = None
+        self.probe_timeout = 0.2  # Response timeout for the first request after connecting [s].
+
+        # Conversion of the raw setpoint (0-32000) to flow units, set in open() from the device capacity.
+        self._sp_scale = (self.pv_set_max - self.pv_set_min) / 32000.0
+        self._sp_offset = self.pv_set_min
+
+        # Parameter values read from the device as {parameter_id: (value, expiry)}, reused until they expire.
+        # The time to live [s] of each parameter, parameters not listed are never cached. A write to a parameter
+        # discards its cached value (see also invalidate_cache).
+        self._cache = {}
+        self._cache_ttl = {
+            181: 1.0,  # Temperature.
+            25: math.inf,  # Fluid name.
+            115: math.inf,  # User tag.
+            129: math.inf,  # Flow units.
+        }
 
         self._thread_lock = Lock()  # Threading lock required to access the serial interface.
 
+        # While connected, only the I/O thread talks to the device: requests are queued as (kind, payload, future).
+        self._inbox = queue.Queue()
+        self._thread_io = None
+
+        # The flow is polled by a background thread while connected, read_pv returns the latest value.
+        self.poll_interval = 1.0  # Interval between flow readings [s].
+        self._latest_pv = None  # (flow, monotonic time of the reading) from the polling thread.
+        self._polling = False
+        self._thread_poll = None
+
     def open(self, comport: str):
         """Connects to the device. The connection must open before data can be sent or received.
 
         :param comport: str
             Identifier of the serial port to which the device is connected."""
         try:
+            self.invalidate_cache()
             with self._thread_lock:
                 self._instrument = propar.instrument(comport)
-            self.specific_name = self.fluid_name.strip()
-            self.pv_set_min = self.read_capacity_0()
-            self.pv_set_max = self.read_capacity_100()
+                self._set_low_latency()
+                constants = self._read_constants_nolock()
+            if constants[3] is None or constants[4] is None:
+                raise ConnectionError("no response from device")
+            for parameter_id, value in zip((129, 25, 115), constants):
+                self._cache_value(parameter_id, value)
+            self.pv_set_min, self.pv_set_max = constants[3:]
+            # The fluid name only serves as display name, a missing value must not prevent the connection.
+            self.specific_name = (constants[1] or '').strip()
+            self._sp_scale = (self.pv_set_max - self.pv_set_min) / 32000.0
+            self._sp_offset = self.pv_set_min
+            self._start_io()
+            self.start_polling(self.poll_interval)
             self.logger(f"Connected to {self.complete_name} on {comport}.")
-        except AttributeError:
-            self._instrument = None
-            self.logger(f"Could not connect to {self.complete_name} on {comport}.", error=True)
-
+        except (AttributeError, OSError, serial.SerialException) as e:
+            self.close()
+            self.logger(f"Could not connect to {self.complete_name} on {comport} ({e}).", error=True)
+
+    def _read_constants_nolock(self) -> list:
+        """Reads the parameters which do not change during a session (flow units, fluid name, tag, capacity 0 and
+        capacity 100) with a single request, the caller must hold self._thread_lock.
+        This is also the first request to the device: a short response timeout is used for it, so that a wrong port
+        fails quickly instead of waiting for the default timeout.
+
+        :return: list
+            The values of the parameters, None for parameters which could not be read. A device which does not answer
+            gives a list of None (never a shorter list), so open reports that there is no response."""
+        master = self._instrument.master
+        response_timeout = getattr(master, 'response_timeout', None)
+        if response_timeout is not None:
+            master.response_timeout = self.probe_timeout
+        try:
+            return self._read_parameters_nolock((129, 25, 115, 183, 21))
+        finally:
+            if response_timeout is not None:
+                master.response_timeout = response_timeout
+
+    def _set_low_latency(self):
+        """Asks the serial driver to deliver received data immediately, instead of waiting for the USB adapter
+        latency timer (16 ms by default on FTDI adapters) which otherwise delays every request.
+        Only supported by pyserial on Linux, elsewhere (or if the driver refuses) the port is left unchanged."""
+        try:
+            serial_port = self._instrument.master.propar.serial
+            if hasattr(serial_port, 'set_low_latency_mode'):
+                serial_port.set_low_latency_mode(True)
+        except (AttributeError, ValueError, OSError) as e:
+            self.logger(f"{self.complete_name}: could not enable low latency mode ({e}).")
 
     def is_open(self) -> bool:
         """Check whether the connection is open.
 
         :return: bool
             True if the connection is open."""
-        return bool(self._instrument)
+        return self._instrument is not None
 
     def close(self):
         """Disconnects the device."""
+        self.stop_polling()
+        self._stop_io()
         with self._thread_lock:
+            instrument = self._instrument
             self._instrument = None
+        if instrument is not None:
+            # Close the port now rather than when the instrument is garbage collected, so it can be reopened.
+            try:
+                instrument.master.propar.serial.close()
+            except Exception as e:
+                self.logger(f"{self.complete_name}: could not close serial port ({e}).", error=True)
+        self.invalidate_cache()
+
+    def _start_io(self):
+        """Starts the thread which performs all requests to the device."""
+        self._inbox = queue.Queue()
+        self._thread_io = Thread(target=self._io_loop)
+        self._thread_io.name = f"{self.complete_name} I/O thread"
+        self._thread_io.daemon = True
+        self._thread_io.start()
+
+    def _stop_io(self):
+        """Stops the I/O thread after it performs the requests already queued."""
+        if self._thread_io:
+            self._inbox.put(None)
+            self._thread_io.join()
+            self._thread_io = None
+
+    def _submit(self, kind: str, payload) -> Future:
+        """Queues a request for the I/O thread.
+
+        :param kind: str
+            'read' (payload: parameter id), 'read_many' (payload: tuple of parameter ids) or 'write' (payload:
+            (parameter id, value) tuple).
+        :param payload:
+            The request data, see kind.
+        :return: Future
+            Resolves to the value read (list of values for 'read_many', None for 'write')."""
+        future = Future()
+        self._inbox.put((kind, payload, future))
+        return future
+
+    def _io_loop(self):
+        """Target for the I/O thread, performs queued requests until a None request is received. All requests waiting
+        in the queue are performed together, consecutive reads as a single chained request."""
+        running = True
+        while running:
+            requests = [self._inbox.get()]
+            while True:
+                try:
+                    requests.append(self._inbox.get_nowait())
+                except queue.Empty:
+                    break
+            if None in requests:
+                running = False
+                requests = requests[:requests.index(None)]
+            with self._thread_lock:
+                self._process_requests(requests)
+        # Anything queued after the stop request cannot be performed anymore.
+        while True:
+            try:
+                request = self._inbox.get_nowait()
+            except queue.Empty:
+                break
+            if request:
+                request[2].set_exception(ConnectionError(f"{self.complete_name} was disconnected."))
+
+    def _process_requests(self, requests: list):
+        """Performs a list of requests in order, the caller must hold self._thread_lock.
+
+        :param requests: list
+            Requests as queued by _submit."""
+        reads = []
+        for kind, payload, future in requests:
+            if kind == 'write':
+                self._perform_reads(reads)
+                reads = []
+                try:
+                    self._write_parameter_nolock(*payload)
+                    future.set_result(None)
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                reads.append((kind, payload, future))
+        self._perform_reads(reads)
+
+    def _perform_reads(self, reads: list):
+        """Performs read requests with a single chained request, the caller must hold self._thread_lock.
+
+        :param reads: list
+            'read' and 'read_many' requests as queued by _submit."""
+        if not reads:
+            return
+        parameter_ids = []
+        for kind, payload, future in reads:
+            parameter_ids.extend(payload if kind == 'read_many' else (payload,))
+        try:
+            if len(parameter_ids) == 1:
+                values = [self._read_parameter_nolock(parameter_ids[0])]
+            else:
+                values = self._read_parameters_nolock(parameter_ids)
+            # Distributing the values inside the try: a bad batch must fail its requests, not the I/O thread.
+            index = 0
+            for kind, payload, future in reads:
+                if kind == 'read_many':
+                    future.set_result(values[index:index + len(payload)])
+                    index += len(payload)
+                else:
+                    future.set_result(values[index])
+                    index += 1
+        except Exception as e:
+            for kind, payload, future in reads:
+                if not future.done():
+                    future.set_exception(e)
+
+    def start_polling(self, interval: float):
+        """Starts a background thread which reads the flow periodically, read_pv then returns the latest reading
+        instead of waiting for the device.
+
+        :param interval: float
+            Time between consecutive readings [s]."""
+        self.stop_polling()
+        self.poll_interval = interval
+        self._polling = True
+        self._thread_poll = Thread(target=self._poll_pv)
+        self._thread_poll.name = f"{self.complete_name} polling thread"
+        self._thread_poll.daemon = True
+        self._thread_poll.start()
+
+    def stop_polling(self):
+        """Stops the background thread reading the flow, if running."""
+        self._polling = False
+        if self._thread_poll:
+            self._thread_poll.join(self.poll_interval * 2)
+            self._thread_poll = None
+        self._latest_pv = None
+
+    def _poll_pv(self):
+        """Target for the polling thread, reads the flow until polling is stopped or the device disconnected."""
+        while self._polling:
+            if self._thread_io is None:
+                break
+            try:
+                value = self.read_parameter(205)
+            except Exception as e:
+                # Keep polling, a single failed request must not stop the readings.
+                self.logger(f"{self.complete_name} failed to read the flow ({e}).", error=True)
+                value = None
+            if value is not None:
+                self._latest_pv = (value, time.monotonic())
+            time.sleep(self.poll_interval)
+
+    def invalidate_cache(self):
+        """Discards all cached parameter values, they will be read again from the device on the next access.
+        Call this if the device is re-configured while connected."""
+        self._cache.clear()
+
+    def _cache_value(self, parameter_id: int, value):
+        """Stores a value read from the device in the cache, if the parameter is cached.
+
+        :param parameter_id: int
+            The identifier of the parameter.
+        :param value:
+            The value read from the device."""
+        ttl = self._cache_ttl.get(parameter_id, 0.0)
+        if ttl > 0.0 and value is not None:
+            self._cache[parameter_id] = (value, time.monotonic() + ttl)
+
+    def _read_parameter_nolock(self, parameter_id: int):
+        """Read a parameter from the device, only called by the I/O thread (or before it starts) holding
+        self._thread_lock.
+
+        :param parameter_id: int
+            The identifier of the required parameter.
+        :return: The value of the requested parameter."""
+        return self._instrument.readParameter(parameter_id)
+
+    def _read_parameters_nolock(self, parameter_ids) -> list:
+        """Read several parameters from the device with a single request, only called by the I/O thread (or before it
+        starts) holding self._thread_lock.
+
+        :param parameter_ids: iterable of int
+            The identifiers of the required parameters.
+        :return: list
+            The values of the requested parameters, in the same order, None for parameters which could not be read."""
+        parameters = [self._instrument.db.get_parameter(parameter_id) for parameter_id in parameter_ids]
+        response = self._instrument.read_parameters(parameters)
+        # On a timeout or error propar returns a single status item instead of one item per parameter.
+        if len(response) != len(parameters):
+            return [None] * len(parameters)
+        return [value.get('data') for value in response]
+
+    def _write_parameter_nolock(self, parameter_id: int, value):
+        """Write a parameter to the device, only called by the I/O thread holding self._thread_lock.
+
+        :param parameter_id: int
+            The identifier of the required parameter.
+        :param value:
+            The value to be written."""
+        self._instrument.writeParameter(parameter_id, value)
 
     def read_parameter(self, parameter_id: int):
         """Read a parameter from the device.
@@ -69,11 +338,15 @@ class MassFlowController(MonitorDevice):
         :param parameter_id: int
             The identifier of the required parameter.
         :return: The value of the requested parameter."""
-        if self.is_open():
-            with self._thread_lock:
-                return self._instrument.readParameter(parameter_id)
-        else:
+        if self._thread_io is None:
             self.logger(f"{self.complete_name} cannot read parameter: device is not connected.", error=True)
+            return None
+        value, expiry = self._cache.get(parameter_id, (None, 0.0))
+        if time.monotonic() < expiry:
+            return value
+        value = self._submit('read', parameter_id).result()
+        self._cache_value(parameter_id, value)
+        return value
 
     def write_parameter(self, parameter_id: int, value):
         """Write a parameter to the device.
@@ -82,17 +355,37 @@ class MassFlowController(MonitorDevice):
             The identifier of the required parameter.
         :param value:
             The value to be written."""
-        if self.is_open():
-            with self._thread_lock:
-                self._instrument.writeParameter(parameter_id, value)
-        else:
+        if self._thread_io is None:
             self.logger(f"{self.complete_name} cannot write parameter: device is not connected.", error=True)
+            return
+        self._cache.pop(parameter_id, None)
+        self._submit('write', (parameter_id, value)).result()
+
+    def read_status_bundle(self) -> dict:
+        """Reads the status parameters of the device (flow, setpoint, measure, temperature) with a single request.
+
+        :return: dict
+            The values of the parameters by name ('flow', 'setpoint', 'measure', 'temperature'), values are None
+            if the device is not connected."""
+        names = ('flow', 'setpoint', 'measure', 'temperature')
+        if self._thread_io is None:
+            self.logger(f"{self.complete_name} cannot read parameters: device is not connected.", error=True)
+            return dict.fromkeys(names)
+        status = dict(zip(names, self._submit('read_many', (205, 9, 8, 181)).result()))
+        self._cache_value(181, status['temperature'])
+        return status
 
     def read_pv(self) -> float:
         """Read current flow from device.
 
         :return: float
             Flow read by device in mln/min."""
+        latest_pv = self._latest_pv
+        # A reading older than two polling intervals means polling failed or stopped, the device is asked directly.
+        if (self._polling and latest_pv is not None and self._thread_poll is not None
+                and self._thread_poll.is_alive()
+                and time.monotonic() - latest_pv[1] <= 2 * self.poll_interval):
+            return latest_pv[0]
         return self.read_parameter(205)
 
     def write_sp(self, flow: float):
@@ -107,14 +400,14 @@ class MassFlowController(MonitorDevice):
 
         :return: float
             Setpoint of device in mln/min."""
-        return self.read_parameter(9)*self.pv_set_max/32000.0 + self.pv_set_min
+        return self.read_parameter(9) * self._sp_scale + self._sp_offset
 
     @property
     def flow(self) -> float:
         """Mass flow in mLn/min.
         Setting this value acts on the set-point of the device.
         Reading the value reads the measured flow, not the set-point."""
-        return self.read_parameter(205)
+        return self.read_pv()
 
     @flow.setter
     def flow(self, flow):
@@ -176,11 +469,11 @@ class MassFlowController(MonitorDevice):
 
         :return: str
             device description."""
-        msg = self.name + ":\n"
-        msg += "\tFlow: " + str(round(self.flow, 2)) + " " + self.flow_units + "\n"
-        msg += "\tSet-point: " + str(self.setpoint) + "\n"
-        msg += "\tMeasure: " + str(self.measure) + "\n"
-        msg += "\tT: " + str(round(self.temperature, 2)) + "'C\n"
-        msg += "\tFluid: " + self.fluid_name + "\n"
-        msg += "\tUser tag: " + self.tag + "\n"
-        return msg
+        status = self.read_status_bundle()
+        return (f"{self.complete_name}:\n"
+                f"\tFlow: {status['flow']:.2f} {self.flow_units}\n"
+                f"\tSet-point: {status['setpoint']}\n"
+                f"\tMeasure: {status['measure']}\n"
+                f"\tT: {status['temperature']:.2f}'C\n"
+                f"\tFluid: {self.fluid_name}\n"
+                f"\tUser tag: {self.tag}\n")
@@ -24,12 +24,13 @@ import Back_Pressure_Regulator
 import Solar_Light_Source
 import Mass_Flow_Controller
 # import Temperature_Control
-from Default_Logger import print_message
+from Default_Logger import print_message, timestamp
 
 from os import getcwd
 import os.path
 import time
 import threading
+import queue
 
 # Automation GUI
 import Schedule
@@ -41,6 +42,8 @@ class MonitorWindow(tk.Tk):
     """A tkinter root with specific behaviour to control the solar simulator devices and show realtime data from
     them."""
 
+    LOG_MAX_LINES = 5000  # Older messages are removed from the logging area beyond this number of lines.
+
     def __init__(self, device_configuration):
         """Creates the main window of the Solar Simulator Monitor.
 
@@ -52,16 +55,19 @@ class MonitorWindow(tk.Tk):
         self.iconphoto(True, MonitorWindow.get_icon())
 
         self.title("Solar Simulator - Interactive Control")
-        self.geometry("1200x850")
+        self._window_width = 1200
+        self._window_height = 850
+        self.geometry(f"{self._window_width}x{self._window_height}")
         self._text_font = tk.font.nametofont('TkTextFont')
         self._text_font['size'] = 12
 
         self.update_interval = 1.0  # Interval between continuous updates [S].
+        self.idle_update_ratio = 5  # While no device is enabled, devices are read once every this many updates.
 
         self._left_frame = ttk.Panedwindow(master=self, orient=tk.VERTICAL)
         self._left_frame.grid(column=0, row=0, sticky='N')
         self._right_frame = ttk.Frame(master=self)
-        self._right_frame.grid(column=1, row=0)
+        self._right_frame.grid(column=1, row=0, sticky='NSEW')
         self._bottom_frame = ttk.Frame(master=self, height=500)
         self._bottom_frame.grid(column=0, row=1, columnspan=2, sticky='EW')
         self.columnconfigure(index=0, weight=0)
@@ -94,6 +100,7 @@ class MonitorWindow(tk.Tk):
         # The following are defined when the calibration window pops up.
         self._device_bpr = None
         self._window_bpr_cal = None
+        self._image_bpr_sensor = None  # Loaded the first time the calibration window opens.
         self._field_calibration_1 = None
         self._field_calibration_2 = None
 
@@ -102,6 +109,9 @@ class MonitorWindow(tk.Tk):
         self._autotune_is_running = False
 
         self._device_panes = []
+        self._pane_by_device = {}  # DevicePane for each device.
+        self._plot_panes = []  # Device panes with a plot.
+        self._enable_panes = []  # Device panes with an enable button.
         try:
             for device in device_configuration:
                 self.add_device(device['type'], device['comport'])
@@ -114,14 +124,23 @@ class MonitorWindow(tk.Tk):
         self._automation_schedule = Schedule.Schedule(self, [devicepane.device for devicepane in self._device_panes])
         self._automation_schedule.logger = self.print_log
 
-        self._time_0 = time.time()
+        self._time_0 = time.monotonic()  # Start of the elapsed time shown in plots and data log.
         self._updating_status = False
+        # Samples read by the update thread as (time, [(DevicePane, value)]), shown by the tkinter main thread.
+        self._sample_queue = queue.SimpleQueue()
+        self._sample_drain_interval_ms = 50
+        self._sample_drain_job = None
         self._thread_update = threading.Thread(target=self._update_status_loop)
         self._thread_update.name = 'Continuous update thread'
         self._thread_update.daemon = True
 
     @staticmethod
     def get_icon():
+        """Loads the program icon. Tk images belong to the Tk root which is active when they are created, so the icon
+        cannot be shared between roots (e.g. MultipleChoiceWindow and MonitorWindow) and is loaded once for each.
+
+        :return: tk.PhotoImage
+            The icon, None if the file could not be opened."""
         project_root = getcwd()
         try:
             icon = tk.PhotoImage(file=os.path.join(project_root, 'imgs', 'NRG_icon.png'))
@@ -132,6 +151,9 @@ class MonitorWindow(tk.Tk):
 
     def destroy(self):
         """Override parent destroy function to close all serial communications."""
+        if self._sample_drain_job:
+            self.after_cancel(self._sample_drain_job)
+            self._sample_drain_job = None
         if self._thread_update.is_alive():
             self._updating_status = False
             self._thread_update.join(self.update_interval * 3)
@@ -149,16 +171,19 @@ class MonitorWindow(tk.Tk):
         """Override parent mainloop to start update thread."""
         self._updating_status = True
         self._thread_update.start()
+        self._sample_drain_job = self.after(self._sample_drain_interval_ms, self._drain_sample_queue)
         super().mainloop()
 
     def _get_data_log_path(self):
         """Initialize the log files."""
         datadir = os.path.join(self.project_root, 'data')
-        if not os.path.isdir(datadir):
-            os.mkdir(datadir)
+        os.makedirs(datadir, exist_ok=True)
         data_file_name = time.strftime('%Y-%m-%d_%H-%M_device_monitor_data_log.csv')
         data_file_path = os.path.join(datadir, data_file_name)
-        if os.path.isfile(data_file_path):
+        # Create the file right away, so that an existing file is detected and never overwritten.
+        try:
+            open(data_file_path, 'x').close()
+        except FileExistsError:
             self.print_log('Cannot save data to log, file already exists!', error=True)
             self.print_log(f"Filename: {data_file_path}", error=True)
             return None
@@ -186,6 +211,11 @@ class MonitorWindow(tk.Tk):
             self.print_log(f"{devicetype} device not found.", error=True)
             device_pane.enable = False
         self._device_panes.append(device_pane)
+        self._pane_by_device[device_pane.device] = device_pane
+        if device_pane.plot_index >= 0:
+            self._plot_panes.append(device_pane)
+        if device_pane.device.has_enable:
+            self._enable_panes.append(device_pane)
 
     def _add_plot_subplot(self, device_pane):
         """Set up a subplot within the plotting area showing data from the device linked to a pane.
@@ -193,19 +223,34 @@ class MonitorWindow(tk.Tk):
         :param device_pane: DevicePane
             The device pane linked to the device of interest."""
         datalen = 1000
-        y_data = np.zeros(datalen)
-        x_data = np.arange(start=-(datalen * self.update_interval)/60, stop=0, step=self.update_interval/60)
-        x_data = x_data[0:datalen]
+        # Times and values are kept together as the rows of one buffer, so that both shift with a single copy.
+        plot_data = np.zeros((2, datalen))
+        plot_data[0] = np.arange(-datalen, 0) * (self.update_interval / 60)
+        x_data, y_data = plot_data
 
         device_pane.plot_axes = self._plot_figure.add_subplot(DevicePane.PLOT_INDEX_MAX, 1, device_pane.plot_index + 1,
                                                               frameon=False, ymargin=0, xmargin=0)
         device_pane.plot_axes.set_ylabel(device_pane.plot_label())
         device_pane.plot_line, = device_pane.plot_axes.plot(x_data, y_data)
-        device_pane.plot_line.set(color=device_pane.plot_color())
+        # The line is drawn by blitting (see _flush_plots), it is excluded from full redraws of the figure.
+        device_pane.plot_line.set(color=device_pane.plot_color(), animated=True)
+        device_pane.plot_data = plot_data
+        device_pane.plot_x = x_data
+        device_pane.plot_y = y_data
+        device_pane.plot_xlim_hi = x_data[-1]
+        device_pane.plot_ylim_hi = 0.5
+        device_pane.plot_axes.set_xlim(x_data[0], device_pane.plot_xlim_hi)
+        device_pane.plot_axes.set_ylim(-0.1, device_pane.plot_ylim_hi)
 
     def _add_plot_area(self):
         """Set up the plotting area of the window."""
-        self._plot_figure = Figure(figsize=(20, 10), dpi=100)
+        # The figure is created with the size left for it in the window, so that the Agg buffer is not larger than
+        # the visible area. The canvas fills the right frame, FigureCanvasTkAgg resizes the figure with the window.
+        dpi = 100
+        self.update_idletasks()
+        width = max(self._window_width - self._left_frame.winfo_reqwidth(), dpi)
+        height = max(self._window_height - self._bottom_frame.winfo_reqheight(), dpi)
+        self._plot_figure = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
         self._plot_figure.subplots_adjust(left=0.125, bottom=0.08, right=0.99, top=0.99, wspace=0, hspace=0)
         self._plots = []
 
@@ -223,23 +268,81 @@ class MonitorWindow(tk.Tk):
         device_panes[-1].plot_axes.set_xlabel('Time [min]')
 
         self._plot_canvas = FigureCanvasTkAgg(self._plot_figure, master=self._right_frame)
+        self._plot_canvas.mpl_connect('draw_event', self._on_plot_draw)
         self._plot_canvas.draw()
-        self._plot_canvas.get_tk_widget().pack(fill=tk.BOTH)
-
-    def _add_plot_datapoint(self, device_pane, dp_time, dp_pressure):
-        """Update each plot with an additional data-point."""
-        x_data = device_pane.plot_line.get_xdata()
-        y_data = device_pane.plot_line.get_ydata()
-        x_data = np.append(x_data, dp_time)
-        x_data = np.delete(x_data, [0])
-        y_data = np.append(y_data, dp_pressure)
-        y_data = np.delete(y_data, [0])
-        device_pane.plot_line.set_xdata(x_data)
-        device_pane.plot_line.set_ydata(y_data)
-        device_pane.plot_axes.set_xlim(x_data[0], x_data[-1])
-        device_pane.plot_axes.set_ylim(-0.1, max(y_data) + 0.5)
-        self._plot_canvas.draw()
-        self._plot_canvas.flush_events()
+        self._plot_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+    def _drain_sample_queue(self):
+        """Shows all the samples queued by the update thread on the device panes and plots, drawing the plots once.
+        Runs periodically on the tkinter main thread."""
+        redraw = False
+        has_samples = False
+        while True:
+            try:
+                dp_time, datapoints = self._sample_queue.get_nowait()
+            except queue.Empty:
+                break
+            has_samples = True
+            for device_pane, value in datapoints:
+                device_pane.show_value(value)
+                if self._push_plot_datapoint(device_pane, dp_time, value):
+                    redraw = True
+        if has_samples:
+            self._flush_plots(redraw)
+        self._sample_drain_job = self.after(self._sample_drain_interval_ms, self._drain_sample_queue)
+
+    def _push_plot_datapoint(self, device_pane, dp_time, dp_pressure) -> bool:
+        """Add a data-point to the plot data of a device, without drawing.
+
+        :return: bool
+            True if the axis limits changed, so that the whole figure needs to be drawn again."""
+        # Shift the preallocated buffers in place, the oldest data-point is dropped.
+        plot_data = device_pane.plot_data
+        np.copyto(plot_data[:, :-1], plot_data[:, 1:])
+        plot_data[:, -1] = (dp_time, dp_pressure)
+        x_data = device_pane.plot_x
+        y_data = device_pane.plot_y
+        device_pane.plot_line.set_data(x_data, y_data)
+        # Changing the axis limits requires drawing the whole figure again, so they are changed only when needed.
+        redraw = False
+        if dp_time > device_pane.plot_xlim_hi:
+            # The time axis is advanced with a margin (1/10 of the data span) rather than at every data-point.
+            device_pane.plot_xlim_hi = dp_time + (x_data[-1] - x_data[0]) / 10
+            device_pane.plot_axes.set_xlim(x_data[0], device_pane.plot_xlim_hi)
+            redraw = True
+        if dp_pressure + 0.5 > device_pane.plot_ylim_hi:
+            device_pane.plot_ylim_hi = dp_pressure + 1.0
+            device_pane.plot_axes.set_ylim(-0.1, device_pane.plot_ylim_hi)
+            redraw = True
+        elif redraw:
+            # The value axis only shrinks when the figure is drawn again anyway.
+            ylim_hi = y_data.max() + 0.5
+            if ylim_hi < device_pane.plot_ylim_hi:
+                device_pane.plot_ylim_hi = ylim_hi
+                device_pane.plot_axes.set_ylim(-0.1, ylim_hi)
+        return redraw
+
+    def _flush_plots(self, redraw: bool):
+        """Draws the plot lines after their data changed.
+
+        :param redraw: bool
+            If true the whole figure is drawn again, otherwise the lines are drawn over the cached backgrounds."""
+        if redraw:
+            self._plot_canvas.draw_idle()
+            return
+        for device_pane in self._device_panes:
+            if device_pane.plot_axes and device_pane.plot_background is not None:
+                self._plot_canvas.restore_region(device_pane.plot_background)
+                device_pane.plot_axes.draw_artist(device_pane.plot_line)
+        self._plot_canvas.blit(self._plot_figure.bbox)
+
+    def _on_plot_draw(self, event):
+        """Handler for the draw event of the plotting area: caches the background of each subplot for blitting and
+        draws the lines, which are excluded from full redraws."""
+        for device_pane in self._device_panes:
+            if device_pane.plot_axes:
+                device_pane.plot_background = self._plot_canvas.copy_from_bbox(device_pane.plot_axes.bbox)
+                device_pane.plot_axes.draw_artist(device_pane.plot_line)
 
     def _add_log_pane(self):
         """Set up the logging area at the bottom of the window."""
@@ -247,28 +350,40 @@ class MonitorWindow(tk.Tk):
         self._info_log.tag_config('error', foreground='red')
         self._info_log.configure(state='disabled')
         self._info_log.pack(fill=tk.X)
+        # Messages waiting to be shown as (message, tag), they are added to the log area together when tkinter is idle.
+        self._log_pending = []
+        self._log_flush_scheduled = False
 
-    def print_log(self, message: str, **kwargs):
+    def print_log(self, message: str, *, error: bool = False):
         """Print a message in the logging area at the bottom of the window. A timestamp is automatically added
         to the message.
 
         :param message: str
             The message to be given to the user.
-        :param kwargs:
-            See below.
+        :param error: bool
+            If true the message will be highlighted as an error."""
+        message = f"{timestamp()} {message}\n"
+        self._log_pending.append((message, 'error' if error else ()))
+        if not self._log_flush_scheduled:
+            self._log_flush_scheduled = True
+            self.after_idle(self._flush_log)
+        print(message.rstrip())
 
-        :Keyword Arguments:
-            * error (``bool``) --
-              If true the message will be highlighted as an error."""
-        message = f"{time.strftime('%H:%M:%S')} {message}\n"
+    def _flush_log(self):
+        """Adds the pending messages to the logging area."""
+        self._log_flush_scheduled = False
+        pending, self._log_pending = self._log_pending, []
+        if not pending:
+            return
         self._info_log.configure(state='normal')
-        if ('error' in kwargs.keys()) and kwargs['error']:
-            self._info_log.insert(tk.END, message, 'error')
-        else:
-            self._info_log.insert(tk.END, message)
+        for message, tag in pending:
+            self._info_log.insert(tk.END, message, tag)
+        # A long text makes the widget slow, remove the oldest lines (the text always ends with an empty line).
+        line_count = int(self._info_log.index('end-1c').split('.')[0]) - 1
+        if line_count > MonitorWindow.LOG_MAX_LINES:
+            self._info_log.delete('1.0', f"{line_count - MonitorWindow.LOG_MAX_LINES + 1}.0")
         self._info_log.configure(state='disabled')
         self._info_log.yview_moveto(1.0)
-        print(message.rstrip())
 
     @staticmethod
     def show_info():
@@ -288,10 +403,10 @@ class MonitorWindow(tk.Tk):
         Pressure data is transferred within the device as an analog voltage which may need to be manually calibrated
         to ensure the same value is given by the sensor and the device."""
         self._window_bpr_cal = tk.Toplevel()
-        photoimage = ImageTk.PhotoImage(file=os.path.join(self.project_root, 'imgs', 'BPR_sensor.png'))
-        image = ttk.Label(master=self._window_bpr_cal, image=photoimage, text='blabla')
+        if self._image_bpr_sensor is None:
+            self._image_bpr_sensor = ImageTk.PhotoImage(file=os.path.join(self.project_root, 'imgs', 'BPR_sensor.png'))
+        image = ttk.Label(master=self._window_bpr_cal, image=self._image_bpr_sensor, text='blabla')
         image.grid(column=0, row=0, rowspan=3)
-        image.image = photoimage
         explanation = ttk.Label(master=self._window_bpr_cal,
                                 text='Fill in the pressure values as read from the device sensor display (see '
                                      'picture), then press enter.\nStart from a higher pressure value around 4 or 5 '
@@ -348,30 +463,38 @@ safe. If not, please press 'cancel'.""")
         """Target for a thread which constantly requests and updates the monitored values.
         It also reads the initial values which are not continuously monitored."""
         time.sleep(2.0)
-        try:
-            data_file = open(self._file_data_log, 'w')
-        except IOError:
-            data_file = None
-            self.print_log('Cannot write to log file.', error=True)
-        if data_file:
-            data_file.write(f"\"Time [min]\"")
+        data_file = None
+        if self._file_data_log:
+            try:
+                data_file = open(self._file_data_log, 'w')
+            except IOError:
+                self.print_log('Cannot write to log file.', error=True)
         if data_file:
-            for device_pane in self._device_panes:
-                data_file.write(f", \"{device_pane.value_label()}\"")
-        if data_file:
-            data_file.write('\n')
+            labels = [f"\"{device_pane.value_label()}\"" for device_pane in self._device_panes]
+            data_file.write(", ".join(["\"Time [min]\"", *labels]) + '\n')
+        row_templates = {}  # Format strings for a row of the data log, by number of values.
+        # Updates are scheduled at fixed times, so that the time spent reading the devices does not add up.
+        next_update = time.monotonic()
+        idle_updates = 0
         while self._updating_status:
-            current_time = round((time.time() - self._time_0)/60, 2)
+            active = any(device_pane.is_on for device_pane in self._enable_panes)
+            if not active and not self._autotune_is_running:
+                # Nothing is running: the devices are read only once every idle_update_ratio updates.
+                idle_updates += 1
+                if idle_updates < self.idle_update_ratio:
+                    next_update = self._wait_next_update(next_update)
+                    continue
+            idle_updates = 0
+            current_time = round((time.monotonic() - self._time_0)/60, 2)
             values = []
-            active = False
-            for device_pane in self._device_panes:
-                if device_pane.plot_index >= 0 and device_pane.device.is_open():
-                    current_value = device_pane.update_value()
+            datapoints = []
+            for device_pane in self._plot_panes:
+                if device_pane.device.is_open():
+                    current_value = device_pane.read_value()
                     values.append(current_value)
-                    self._add_plot_datapoint(device_pane, current_time, current_value)
-                if device_pane.device.has_enable:
-                    if device_pane.value_on.get() == 1:
-                        active = True
+                    datapoints.append((device_pane, current_value))
+            if datapoints:
+                self._sample_queue.put((current_time, datapoints))
             if self._autotune_is_running:
                 if not self._device_t_control.is_autotune_running():
                     self._autotune_is_running = False
@@ -380,14 +503,30 @@ safe. If not, please press 'cancel'.""")
                     self.print_log('Autotune finished.')
                     self.print_log(str(self._device_t_control.read_pid()))
             if data_file and active:
-                data_file.write(str(current_time))
-                for value in values:
-                    data_file.write(f", {value}")
-                data_file.write('\n')
-            time.sleep(self.update_interval)
+                row_template = row_templates.get(len(values))
+                if row_template is None:
+                    row_template = row_templates[len(values)] = "{}" + ", {}" * len(values) + "\n"
+                data_file.write(row_template.format(current_time, *values))
+            next_update = self._wait_next_update(next_update)
         if data_file:
             data_file.close()
 
+    def _wait_next_update(self, next_update: float) -> float:
+        """Sleeps until the time of the next continuous update.
+
+        :param next_update: float
+            Time of the current update, as given by time.monotonic().
+        :return: float
+            Time of the next update, as given by time.monotonic()."""
+        next_update += self.update_interval
+        delay = next_update - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            # Fell behind, restart the schedule instead of catching up with back-to-back updates.
+            next_update = time.monotonic()
+        return next_update
+
     def change_device_sp_display_value(self, device, sp_value):
         """Changes the setpoint shown for a particular device, regardless of the device actual setpoint.
 
@@ -395,12 +534,10 @@ safe. If not, please press 'cancel'.""")
             The device whose setpoint has changed.
         :param sp_value: float
             The new setpoint to show."""
-        for device_pane in self._device_panes:
-            if device == device_pane.device:
-                if device_pane.label_setpoint:
-                    device_pane.label_setpoint['text'] = device_pane.value_with_units(sp_value)
-                    device_pane._target_value = sp_value
-                break
+        device_pane = self._pane_by_device.get(device)
+        if device_pane and device_pane.label_setpoint:
+            device_pane.label_setpoint['text'] = device_pane.value_with_units(sp_value)
+            device_pane._target_value = sp_value
 
     def change_device_onoff_display_value(self, device, onoff_value):
         """Changes the onoff value shown for a particular device, regardless of the device actual state.
@@ -409,14 +546,12 @@ safe. If not, please press 'cancel'.""")
             The device whose onoff state has changed.
         :param onoff_value: bool
             True if the device should be shown as on."""
-        for device_pane in self._device_panes:
-            if device == device_pane.device:
-                if device_pane.value_on:
-                    value = 0
-                    if onoff_value:
-                        value = 1
-                    device_pane.value_on.set(value)
-                break
+        device_pane = self._pane_by_device.get(device)
+        if device_pane and device_pane.value_on:
+            value = 0
+            if onoff_value:
+                value = 1
+            device_pane.value_on.set(value)
 
 
 class DevicePane(ttk.Labelframe):
@@ -499,9 +634,11 @@ class DevicePane(ttk.Labelframe):
 
         self.button_on = None
         self.value_on = None
+        self.is_on = False  # Follows value_on, can be read from any thread (unlike the tkinter variable).
         if self.device.has_enable:
             row_index += 1
             self.value_on = tk.IntVar()
+            self.value_on.trace_add('write', self._handler_value_on_changed)
             self.button_on = ttk.Checkbutton(master=self, text=DevicePane.INFO[self._devicetype]['on'],
                                              variable=self.value_on, command=self._handler_button_on)
             self.button_on.grid(column=0, row=row_index, columnspan=2, padx=10, pady=3)
@@ -509,9 +646,23 @@ class DevicePane(ttk.Labelframe):
         self.plot_index = -1
         self.plot_axes = None
         self.plot_line = None
+        self.plot_data = None  # Data buffer of the plot line (times, values), updated in place.
+        self.plot_x = None  # Views of the rows of plot_data.
+        self.plot_y = None
+        self.plot_background = None  # Cached rendering of the plot axes without the line, used for blitting.
+        self.plot_xlim_hi = 0.0  # Current upper limits of the plot axes.
+        self.plot_ylim_hi = 0.0
 
         self._target_value = 0.0
         self._enabled = True
+        self._units_suffix = self.device.units_prefix + self.device.units
+        # Text and color currently shown by label_reading, the label is only configured when they change.
+        self._reading_text = None
+        self._reading_foreground = None
+        # Labels depend on the device specific name, they are computed when first needed (see connect_device).
+        self._value_label = None
+        self._plot_label = None
+        self._plot_color = DevicePane.INFO[self._devicetype]['plot color']
 
         if self.device.has_pv:
             self.plot_index = DevicePane.PLOT_INDEX_MAX
@@ -532,8 +683,11 @@ class DevicePane(ttk.Labelframe):
             self.enable = False
             return
         self['text'] += ' '+self.device.specific_name
+        self._value_label = None
+        self._plot_label = None
+        self._units_suffix = self.device.units_prefix + self.device.units
         self._target_value = self.device.read_sp()
-        self.label_setpoint.configure(text=str(self._target_value) + self.device.units_prefix + self.device.units)
+        self.label_setpoint.configure(text=self.value_with_units(self._target_value))
         if self.value_on:
             time.sleep(2)
             if self.device.read_onoff():
@@ -556,6 +710,7 @@ class DevicePane(ttk.Labelframe):
             if self.label_reading:
                 self.label_info.configure(foreground='black')
                 self.label_reading.configure(foreground='black')
+                self._reading_foreground = 'black'
             self.label_setpoint_info.configure(foreground='black')
             self.label_setpoint.configure(foreground='black')
             self.label_set_info.configure(foreground='black')
@@ -567,6 +722,7 @@ class DevicePane(ttk.Labelframe):
             if self.label_reading:
                 self.label_info.configure(foreground='grey')
                 self.label_reading.configure(foreground='grey')
+                self._reading_foreground = 'grey'
             self.label_setpoint_info.configure(foreground='grey')
             self.label_setpoint.configure(foreground='grey')
             self.label_set_info.configure(foreground='grey')
@@ -579,41 +735,58 @@ class DevicePane(ttk.Labelframe):
 
         :return: str
             A description of the y-axis values."""
-        label = self.value_label()
-        if len(label) > 10:
-            label = label.replace(' ', '\n', 1)
-        return label
+        if self._plot_label is None:
+            label = self.value_label()
+            if len(label) > 10:
+                label = label.replace(' ', '\n', 1)
+            self._plot_label = label
+        return self._plot_label
 
     def value_label(self):
         """Gives the text for the label of the value for the linked device.
 
                 :return: str
                     A description of the y-axis values."""
-        space = ' '
-        if self.device.specific_name == '':
-            space = ''
-        return f"{self.device.pv_name} {self.device.specific_name}{space}[{self.device.units}]"
+        if self._value_label is None:
+            space = ' '
+            if self.device.specific_name == '':
+                space = ''
+            self._value_label = f"{self.device.pv_name} {self.device.specific_name}{space}[{self.device.units}]"
+        return self._value_label
 
     def plot_color(self) -> str:
         """Gives a color to use for the plot line based on devicetype.
         :return: str
             html hex stype color string."""
-        return DevicePane.INFO[self._devicetype]['plot color']
+        return self._plot_color
 
-    def update_value(self):
-        """Reads the continuously monitored valued from the device and shows it on the pane.
+    def read_value(self):
+        """Reads the continuously monitored valued from the device, without updating the pane (see show_value).
 
         :return: float
             The value read from the device using default units (%, Bar, mln/min, °C)"""
-        value = round(self.device.read_pv(), 2)
-        self.label_reading.configure(text=self.value_with_units(value))
+        return round(self.device.read_pv(), 2)
+
+    def show_value(self, value):
+        """Shows the continuously monitored value on the pane, must run on the tkinter main thread.
+
+        :param value: float
+            The value read from the device using default units (%, Bar, mln/min, °C)"""
+        text = self.value_with_units(value)
         if value >= self._target_value + self.device.pv_deviation_allowed:
-            self.label_reading.configure(foreground='red')
+            foreground = 'red'
         elif value <= self._target_value - self.device.pv_deviation_allowed:
-            self.label_reading.configure(foreground='blue')
+            foreground = 'blue'
         else:
-            self.label_reading.configure(foreground='black')
-        return value
+            foreground = 'black'
+        if text != self._reading_text or foreground != self._reading_foreground:
+            self.label_reading.configure(text=text, foreground=foreground)
+            self._reading_text = text
+            self._reading_foreground = foreground
+
+    def _handler_value_on_changed(self, *args):
+        """Handler for changes of the enable/disable variable."""
+        self.is_on = self.value_on.get() == 1
 
     def _handler_button_on(self):
         """Handler for the enable/disable button."""
@@ -639,7 +812,7 @@ class DevicePane(ttk.Labelframe):
 
         :return: str
             String of value with units."""
-        return str(value) + self.device.units_prefix + self.device.units
+        return str(value) + self._units_suffix
 
 
 class MultipleChoiceWindow(tk.Tk):
@@ -6,7 +6,7 @@ Description: Automation schedule storage and handling.
 """
 
 import threading
-import pause
+import weakref
 
 import Common_Device
 import Default_Logger
@@ -16,14 +16,34 @@ class ScheduleParameter:
     """Contains information relative to a single parameter in the automation schedule."""
 
     def __init__(self):
-        self.name = ''
-        self.units = ''
+        self._name = ''
+        self._units = ''
+        self._description = None  # Cached, see description.
+        self._id = None  # Position of the parameter in the schedule, set when it is added to it.
         self.off_during_equilibration = False
         self.numeric = True
         self.read_only = False
 
         self._device = None
 
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @name.setter
+    def name(self, name: str):
+        self._name = name
+        self._description = None
+
+    @property
+    def units(self) -> str:
+        return self._units
+
+    @units.setter
+    def units(self, units: str):
+        self._units = units
+        self._description = None
+
     @property
     def device(self) -> Common_Device.MonitorDevice:
         return self._device
@@ -41,18 +61,42 @@ class ScheduleParameter:
 
         :return: str
             Parameter description."""
-        description = self.name
-        if not self.units == '':
-            description += f" [{self.units}]"
-        return description
+        if self._description is None:
+            description = self.name
+            if not self.units == '':
+                description += f" [{self.units}]"
+            self._description = description
+        return self._description
 
 
 class ScheduleRow:
     """Represents data from a single row (conditions) for the schedule."""
 
     def __init__(self, schedule):
-        self._schedule = schedule
-        self._parameter_values = {parameter: None for parameter in schedule.parameters}
+        self._schedule = weakref.proxy(schedule)  # The schedule holds its rows, avoids a reference cycle.
+        self._parameters = schedule.parameters
+        self._values = [None] * len(schedule.parameters)  # Values by parameter id.
+        self._name_index = schedule._name_to_parameter
+        self._device_parameters = schedule._device_parameters
+        # Device settings made by apply, see build_plan. None when they need to be prepared again.
+        self._plan_equilibration = None
+        self._plan_run = None
+
+    def _resolve(self, parameter: ScheduleParameter | str) -> ScheduleParameter:
+        """Finds the parameter referred to by name.
+
+        :param parameter: ScheduleParameter | str
+            The parameter, either as a reference or by name.
+        :return: ScheduleParameter
+            The parameter as a reference.
+        :raise: KeyError
+            If the parameter does not match any in the schedule."""
+        if isinstance(parameter, str):
+            parameter_key = self._name_index.get(parameter)
+            if parameter_key is None:
+                raise KeyError(f"'{parameter}' does not match any parameter name!")
+            return parameter_key
+        return parameter
 
     def __getitem__(self, parameter: ScheduleParameter | str) -> float | str:
         """Return the parameter value for this row.
@@ -63,14 +107,8 @@ class ScheduleRow:
             The value of the parameter.
         :raise: KeyError
             If the parameter does not match any in the schedule."""
-        if isinstance(parameter, str):
-            for parameter_key in self._parameter_values.keys():
-                if parameter_key.name == parameter:
-                    parameter = parameter_key
-                    break
-        if isinstance(parameter, str):
-            raise KeyError(f"'{parameter}' does not match any parameter name!")
-        return self._parameter_values[parameter]
+        parameter = self._resolve(parameter)
+        return self._values[parameter._id]
 
     def __setitem__(self, parameter: ScheduleParameter | str, value: float | str):
         """Set a parameter value for this row.
@@ -79,14 +117,10 @@ class ScheduleRow:
             The parameter whose value should be changed, either as a reference or by name.
         :param value: float | str
             The value to assign"""
-        if isinstance(parameter, str):
-            for parameter_key in self._parameter_values.keys():
-                if parameter_key.name == parameter:
-                    parameter = parameter_key
-                    break
-        if isinstance(parameter, str):
-            raise KeyError(f"'{parameter}' does not match any parameter name!")
-        self._parameter_values[parameter] = value
+        parameter = self._resolve(parameter)
+        self._values[parameter._id] = value
+        if parameter.device:
+            self._plan_run = None
         # if self._schedule.automation_window:
         #     if parameter.name == 'Status':
         #         self._schedule.automation_window.get_row(self._index).label_status.configure(text=value)
@@ -95,36 +129,61 @@ class ScheduleRow:
         #         field.delete(0, tk.END)
         #         field.insert(0, value)
 
+    def build_plan(self):
+        """Prepares the device settings made by apply, from the current parameter values. Called by apply if the
+        values changed since the last call.
+
+        Each setting is a (parameter name, device, action, value) tuple, where action is:
+            'off' turn the device off,
+            'zero' set the setpoint to 0,
+            'sp' set the setpoint to value,
+            'on_sp' turn the device on if it is off, then set the setpoint to value."""
+        self._plan_equilibration = []
+        self._plan_run = []
+        for parameter in self._device_parameters:
+            device = parameter.device
+            value = self._values[parameter._id]
+            run_setting = (parameter.name, device, 'on_sp' if device.has_enable else 'sp', value)
+            self._plan_run.append(run_setting)
+            if parameter.off_during_equilibration:
+                self._plan_equilibration.append((parameter.name, device, 'off' if device.has_enable else 'zero', 0.0))
+            else:
+                self._plan_equilibration.append(run_setting)
+
     def apply(self, equilibration: bool):
         """Applies the parameter values to the physical devices.
 
         :param equilibration: bool
             If True, some devices will be kept off (as specified by parameter.off_during_equilibration)."""
-        for parameter in self._parameter_values.keys():
-            if parameter.device:
-                if not parameter.device.is_open():
-                    self._schedule.logger(f"Cannot set parameter '{parameter.name}', device is not connected!",
-                                          error=True)
-                    continue
-                if parameter.off_during_equilibration and equilibration:
-                    if parameter.device.has_enable:
-                        parameter.device.write_onoff(False)
-                        self._schedule._monitor_window.change_device_onoff_display_value(parameter.device, False)
-                    else:
-                        parameter.device.write_sp(0.0)
-                        self._schedule._monitor_window.change_device_sp_display_value(parameter.device,
-                                                                                      0.0)
-                else:
-                    if parameter.device.has_enable and not parameter.device.read_onoff():
-                        parameter.device.write_onoff(True)
-                        self._schedule._monitor_window.change_device_onoff_display_value(parameter.device, True)
-                    parameter.device.write_sp(self._parameter_values[parameter])
-                    self._schedule._monitor_window.change_device_sp_display_value(parameter.device,
-                                                                                  self._parameter_values[parameter])
+        if self._plan_run is None:
+            self.build_plan()
+        monitor_window = self._schedule._monitor_window
+        # Connections are checked once, has_enable was already resolved by build_plan.
+        open_devices = {parameter.device for parameter in self._device_parameters if parameter.device.is_open()}
+        for name, device, action, value in self._plan_equilibration if equilibration else self._plan_run:
+            if device not in open_devices:
+                self._schedule.logger(f"Cannot set parameter '{name}', device is not connected!", error=True)
+                continue
+            if action == 'off':
+                device.write_onoff(False)
+                monitor_window.change_device_onoff_display_value(device, False)
+            elif action == 'zero':
+                device.write_sp(0.0)
+                monitor_window.change_device_sp_display_value(device, 0.0)
+            else:
+                # Read before batching the writes, reads are not delayed.
+                turn_on = action == 'on_sp' and not device.read_onoff()
+                with device.batch_writes():
+                    if turn_on:
+                        device.write_onoff(True)
+                    device.write_sp(value)
+                if turn_on:
+                    monitor_window.change_device_onoff_display_value(device, True)
+                monitor_window.change_device_sp_display_value(device, value)
 
     def keys(self):
         """Returns a list of keys (parameters) for this row."""
-        return self._parameter_values.keys()
+        return self._parameters
 
 
 class Schedule:
@@ -154,17 +213,22 @@ class Schedule:
         self.parameter_duration.name = 'Duration'
         self.parameter_duration.units = 'min'
 
-        self.parameters = [self.parameter_status,
-                           self.parameter_title,
-                           self.parameter_equilibration,
-                           self.parameter_duration]
+        self.parameters = []
+        self._name_to_parameter = {}  # Parameters by name, see _register_parameter.
+        self._device_parameters = []  # Parameters linked to a device, in schedule order.
+        self._safestate_devices = []  # (device, has_enable) for the parameters linked to a device.
+        for parameter in (self.parameter_status,
+                          self.parameter_title,
+                          self.parameter_equilibration,
+                          self.parameter_duration):
+            self._register_parameter(parameter)
 
         for device in devices:
             device_parameter = ScheduleParameter()
             device_parameter.device = device
             if device.pv_name == "Light intensity":
                 device_parameter.off_during_equilibration = True
-            self.parameters.append(device_parameter)
+            self._register_parameter(device_parameter)
 
         self._conditions = []
 
@@ -176,6 +240,21 @@ class Schedule:
         self.automation_window = None
         self.logger = Default_Logger.print_message
 
+        self._stop_event = threading.Event()  # Set by stop(), wakes up the schedule thread while waiting.
+
+    def _register_parameter(self, parameter: ScheduleParameter):
+        """Adds a parameter to the schedule, its name must be final (rows look parameters up by name).
+
+        :param parameter: ScheduleParameter
+            The parameter to add."""
+        parameter._id = len(self.parameters)
+        self.parameters.append(parameter)
+        # As for a search in order, the first parameter with a given name is the one found.
+        self._name_to_parameter.setdefault(parameter.name, parameter)
+        if parameter.device is not None:
+            self._device_parameters.append(parameter)
+            self._safestate_devices.append((parameter.device, parameter.device.has_enable))
+
     @property
     def running(self):
         """Lets you know whether the automation schedule is running."""
@@ -183,6 +262,8 @@ class Schedule:
 
     def start(self):
         """Starts the automation schedule thread."""
+        self._stop_event.clear()
+        self._running = True
         self._thread_run = threading.Thread(target=self._update_conditions)
         self._thread_run.name = 'Automation Schedule Thread'
         self._thread_run.daemon = True
@@ -191,21 +272,21 @@ class Schedule:
     def stop(self):
         """Stops the automation schedule thread at the first opportunity."""
         self._running = False
+        self._stop_event.set()
         self._thread_run.join(2)
         self._thread_run = None
         self.safestate()
 
     def safestate(self):
-        for parameter in self.parameters:
-            if parameter.device is not None:
-                if not parameter.device.is_open():
-                    continue
-                if parameter.device.has_enable:
-                    parameter.device.write_onoff(False)
-                    self._monitor_window.change_device_onoff_display_value(parameter.device, False)
-                else:
-                    parameter.device.write_sp(0.0)
-                    self._monitor_window.change_device_sp_display_value(parameter.device, 0.0)
+        for device, has_enable in self._safestate_devices:
+            if not device.is_open():
+                continue
+            if has_enable:
+                device.write_onoff(False)
+                self._monitor_window.change_device_onoff_display_value(device, False)
+            else:
+                device.write_sp(0.0)
+                self._monitor_window.change_device_sp_display_value(device, 0.0)
 
     def __iter__(self):
         """Start iterating.
@@ -256,28 +337,36 @@ class Schedule:
 
     def _update_conditions(self):
         """This function is run as a separate thread to update the reaction conditions according to the schedule.
-        self._running is checked when changing conditions and setting it to false will stop the thread. Keep in mind
-        that this can take a long time to be checked."""
+        The thread stops after the current device settings are applied when stop() is called, waits are interrupted
+        immediately."""
         self._run_index = 0
-        self._running = True
         while self._run_index < len(self):
-            self.logger('Running '+self._conditions[self._run_index][self.parameter_title])
+            row = self._conditions[self._run_index]
+            self.logger('Running '+row[self.parameter_title])
             self._set_run_status(self._run_index, 'equilibrating')
-            self._conditions[self._run_index].apply(equilibration=True)
-            pause.minutes(self._conditions[self._run_index][self.parameter_equilibration])
+            row.apply(equilibration=True)
+            self._sleep_cancellable(row[self.parameter_equilibration])
             if not self.running:
                 break
             self._set_run_status(self._run_index, 'running')
-            self._conditions[self._run_index].apply(equilibration=False)
-            pause.minutes(self._conditions[self._run_index][self.parameter_duration])
-            self._set_run_status(self._run_index, 'done')
-            self._run_index += 1
+            row.apply(equilibration=False)
+            self._sleep_cancellable(row[self.parameter_duration])
             if not self._running:
                 break
+            self._set_run_status(self._run_index, 'done')
+            self._run_index += 1
         self.safestate()
         if self.automation_window:
             self.automation_window.enable_start(True)
 
+    def _sleep_cancellable(self, minutes: float):
+        """Waits for the given time, or until the schedule is stopped. The time is measured with the monotonic clock,
+        so changes to the system clock do not affect it.
+
+        :param minutes: float
+            The time to wait [min]."""
+        self._stop_event.wait(minutes * 60)
+
     def _set_run_status(self, index: int, status: str):
         """Changes the status of a specific run condition and how it appears on the window.
 
@@ -287,4 +376,6 @@ class Schedule:
             The status to set the run to."""
         self._conditions[index][self.parameter_status] = status
         if self.automation_window:
-            self.automation_window.get_row(index).label_status.configure(text=status)
+            window_row = self.automation_window.get_row(index)
+            if window_row:
+                window_row.set_value(self.automation_window.status_column, status)
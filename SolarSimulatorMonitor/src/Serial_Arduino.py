@@ -5,9 +5,11 @@ GitHub: https://github.com/simone16
 Description: Interface for controlling arduino-based serial devices.
 """
 
+import queue
 import serial
-from threading import Lock
-from time import sleep
+from contextlib import contextmanager
+from threading import Lock, Thread, local
+from time import monotonic, sleep
 from Common_Device import MonitorDevice
 
 
@@ -42,6 +44,9 @@ class Arduino(MonitorDevice):
     meant for which thread, a lock prevents concurrent access (the thread will pause until the previous thread receives
     a response)."""
 
+    # Accepted access strings, normalized to 'r', 'w' or 'rw'.
+    _ACCESS = {'r': 'r', 'R': 'r', 'w': 'w', 'W': 'w', 'rw': 'rw', 'RW': 'rw'}
+
     def __init__(self):
         MonitorDevice.__init__(self)
 
@@ -53,17 +58,32 @@ class Arduino(MonitorDevice):
         self._serial_iface.write_timeout = 1
 
         self._thread_lock = Lock()  # Threading lock required to access the serial interface.
+        self._batch = local()  # Commands written within batch_writes, separately for each thread.
+
+        # While connected, a thread reads the lines received from the device into a queue.
+        self._responses = queue.Queue()
+        self._reading = False
+        self._thread_read = None
 
         self._variables = {}
-        self._access_R = ('r', 'R')
-        self._access_W = ('w', 'W')
-        self._access_RW = ('rw', 'RW')
+        self._used_numbers = set()  # Numbers of the variables in self._variables.
+        # Values read from the device as (value, expiry time) by variable name, only for the variables listed in
+        # _cache_ttl with their time to live [s]. Writing a variable discards its cached value.
+        self._cache = {}
+        self._cache_ttl = {}
         self.add_variable('ID', 1, 'rw', 'str', 'Device identifier')
 
     def __del__(self):
         if self.is_open():
             self.close()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.is_open():
+            self.close()
+
     def add_variable(self, name: str, variable_number: int, access: str, variable_type: str, description: str = '')\
             -> None:
         """Adds a variable to the serial communication protocol for this device.
@@ -85,26 +105,19 @@ class Arduino(MonitorDevice):
                 'none' nothing is returned or set
         :param description: str
             An optional description."""
-        if name in self._variables.keys():
+        if name in self._variables:
             self.logger(f"{self.complete_name}: overriding variable '{name}'.")
         if variable_number <= 0:
             self.logger(f"{self.complete_name}: attempting to add invalid variable number: '{variable_number}'",
                         error=True)
             return
-        for variable in self._variables.values():
-            if variable_number == variable['number']:
-                self.logger(f"{self.complete_name}: attempting to add duplicate variable number: '{variable_number}'",
-                            error=True)
-                return
-
-        _access = ''
-        if access in self._access_R:
-            _access = 'r'
-        elif access in self._access_W:
-            _access = 'w'
-        elif access in self._access_RW:
-            _access = 'rw'
-        else:
+        if variable_number in self._used_numbers:
+            self.logger(f"{self.complete_name}: attempting to add duplicate variable number: '{variable_number}'",
+                        error=True)
+            return
+
+        _access = Arduino._ACCESS.get(access)
+        if _access is None:
             self.logger(f"{self.complete_name}: attempting to add variable with invalid access: '{access}'",
                         error=True)
             return
@@ -112,10 +125,16 @@ class Arduino(MonitorDevice):
             self.logger(f"{self.complete_name}: attempting to add variable with invalid type: '{variable_type}'",
                         error=True)
             return
+        if name in self._variables:
+            self._used_numbers.discard(self._variables[name]['number'])
+        self._used_numbers.add(variable_number)
         self._variables[name] = {'number': variable_number,
                                  'access': _access,
                                  'type': variable_type,
-                                 'description': description}
+                                 'description': description,
+                                 # Commands are encoded once here (see the protocol in the class description).
+                                 'read_command': f"R{variable_number}\n".encode('ascii'),
+                                 'write_prefix': f"S{variable_number}=".encode('ascii')}
 
     @property
     def variables(self) -> list:
@@ -124,19 +143,65 @@ class Arduino(MonitorDevice):
         :return: list
             A list of (name, access, type, description) tuples listing the supported variable names."""
         return [(name,
-                 self._variables[name]['access'],
-                 self._variables[name]['type'],
-                 self._variables[name]['description']) for name in self._variables.keys()]
+                 variable['access'],
+                 variable['type'],
+                 variable['description']) for name, variable in self._variables.items()]
 
     def flush_buffer_in(self) -> str:
         """Read everything from the incoming buffer and return it as a string.
 
         :return: str
             The contents of the incoming data buffer."""
-        bytes_to_read = self._serial_iface.in_waiting
-        if bytes_to_read > 0:
-            return self._serial_iface.read(bytes_to_read).decode('ascii')
-        return ''
+        if self._thread_read is None:
+            bytes_to_read = self._serial_iface.in_waiting
+            if bytes_to_read > 0:
+                return self._serial_iface.read(bytes_to_read).decode('ascii')
+            return ''
+        lines = []
+        while True:
+            try:
+                lines.append(self._responses.get_nowait())
+            except queue.Empty:
+                break
+        return ''.join(lines)
+
+    def _read_loop(self):
+        """Target for the reading thread, queues the lines received from the device until the connection closes."""
+        received = b''
+        while self._reading:
+            try:
+                # Wait for the first byte, then take everything already buffered at once (readline and read_until
+                # read one byte per call).
+                received += self._serial_iface.read(self._serial_iface.in_waiting or 1)
+            except (serial.SerialException, TypeError, AttributeError) as e:
+                # The port closed or failed (the device was disconnected).
+                if self._reading:
+                    self.logger(f"{self.complete_name} stopped receiving data: {e}", error=True)
+                break
+            # An incomplete line is kept, the rest of it may still come.
+            *lines, received = received.split(b'\n')
+            for line in lines:
+                self._responses.put(line.decode('ascii', errors='replace') + '\n')
+
+    def _start_reading(self):
+        """Starts the thread which reads the data received from the device."""
+        self._responses = queue.Queue()
+        self._reading = True
+        self._thread_read = Thread(target=self._read_loop)
+        self._thread_read.name = f"{self.complete_name} reading thread"
+        self._thread_read.daemon = True
+        self._thread_read.start()
+
+    def _stop_reading(self):
+        """Stops the thread which reads the data received from the device."""
+        self._reading = False
+        if self._thread_read:
+            try:
+                self._serial_iface.cancel_read()
+            except (AttributeError, serial.SerialException):
+                pass  # Not supported on all platforms, the read returns within the timeout anyway.
+            self._thread_read.join((self._serial_iface.timeout or 0) + 1)
+            self._thread_read = None
 
     def read_variable(self, name: str) -> int | float | str:
         """Sends a command to the device, returns the response.
@@ -146,40 +211,58 @@ class Arduino(MonitorDevice):
             For a list of variables see self.variables.
         :return: int | float | str
             The value of the variable."""
-        if name not in self._variables.keys():
+        variable = self._variables.get(name)
+        if variable is None:
             self.logger(f"{self.complete_name}: unknown variable name: '{name}'", error=True)
             return 0
+        variable_type = variable['type']
         return_value = 0
-        if self._variables[name]['type'] == 'float':
+        if variable_type == 'float':
             return_value = 0.0
-        elif self._variables[name]['type'] == 'str':
+        elif variable_type == 'str':
             return_value = ''
-        if self._variables[name]['access'] in self._access_W:
+        if variable['access'] == 'w':
             self.logger(f"{self.complete_name}: variable '{name}' is write-only.", error=True)
             return return_value
+        value, expiry = self._cache.get(name, (None, 0.0))
+        if monotonic() < expiry:
+            return value
+        # Only the exchange with the device is done holding the lock, the response is parsed after releasing it.
         with self._thread_lock:
             try:
                 buf = self.flush_buffer_in()
                 if buf:
                     self.logger(f"{self.complete_name} received unexpected data: '{buf}'", error=True)
-                command = f"R{self._variables[name]['number']}\n"
-                self._serial_iface.write(command.encode('ascii'))
-                read_value = self._serial_iface.readline().decode('ascii')
-                if read_value == '':
-                    return return_value
-                return_value = read_value
-                if self._variables[name]['type'] == 'float':
-                    return float(return_value)
-                elif self._variables[name]['type'] == 'int':
-                    return int(return_value)
-                elif self._variables[name]['type'] == 'str':
-                    return return_value.rstrip()
-                else:
-                    return return_value
-            except (serial.SerialException, ValueError) as e:
+                self._serial_iface.write(variable['read_command'])
+                if self._thread_read is None:
+                    raise serial.SerialException('device is not connected')
+                try:
+                    read_value = self._responses.get(timeout=self._serial_iface.timeout)
+                except queue.Empty:
+                    read_value = ''
+            except serial.SerialException as e:
                 self.logger(str(e))
                 self.logger(f"{self.complete_name} failed to read variable '{name}'", error=True)
-        return return_value
+                return return_value
+        if read_value == '':
+            return return_value
+        try:
+            if variable_type == 'float':
+                value = float(read_value)
+            elif variable_type == 'int':
+                value = int(read_value)
+            elif variable_type == 'str':
+                value = read_value.rstrip()
+            else:
+                value = read_value
+        except ValueError as e:
+            self.logger(str(e))
+            self.logger(f"{self.complete_name} failed to read variable '{name}'", error=True)
+            return read_value
+        ttl = self._cache_ttl.get(name)
+        if ttl:
+            self._cache[name] = (value, monotonic() + ttl)
+        return value
 
     def write_variable(self, name: str, value: int | float | str | None) -> None:
         """Writes the desired value to a variable within the device.
@@ -189,31 +272,90 @@ class Arduino(MonitorDevice):
             For a list of variables see self.variables.
         :param value: int | float | str | None
             The value of the variable."""
-        if name not in self._variables.keys():
+        variable = self._variables.get(name)
+        if variable is None:
             self.logger(f"{self.complete_name}: unknown variable name: '{name}'", error=True)
             return
-        if self._variables[name]['access'] in self._access_R:
+        if variable['access'] == 'r':
             self.logger(f"{self.complete_name}: attempt to write read-only variable '{name}'.", error=True)
             return
+        self._cache.pop(name, None)
+        if value is None or variable['type'] == 'none':
+            value = ''
+        try:
+            command = variable['write_prefix'] + str(value).encode('ascii') + b'\n'
+        except ValueError as e:
+            self.logger(str(e))
+            self.logger(f"{self.complete_name}: failed to write variable '{name}'", error=True)
+            return
+        commands = getattr(self._batch, 'commands', None)
+        if commands is not None:
+            commands += command
+            return
         with self._thread_lock:
             try:
                 buf = self.flush_buffer_in()
                 if buf:
                     self.logger(f"{self.complete_name} received unexpected data: '{buf}'", error=True)
-                if value is None or self._variables[name]['type'] == 'none':
-                    value = ''
-                command = f"S{self._variables[name]['number']}={value}\n"
-                self._serial_iface.write(command.encode('ascii'))
+                self._serial_iface.write(command)
             except (serial.SerialException, ValueError) as e:
                 self.logger(str(e))
                 self.logger(f"{self.complete_name}: failed to write variable '{name}'", error=True)
 
+    def write_many(self, values) -> None:
+        """Writes several variables within the device with a single serial write.
+
+        :param values: iterable of (str, int | float | str | None) tuples
+            The (name, value) pairs of the variables to be written, in order.
+            For a list of variables see self.variables."""
+        with self.batch_writes():
+            for name, value in values:
+                self.write_variable(name, value)
+
+    @contextmanager
+    def batch_writes(self):
+        """Context manager, the variables written by this thread within the context are sent to the device with a
+        single write when it exits. Reads are not delayed, so do not read variables written within the same context.
+        Contexts can be nested, the commands are sent when the outermost exits."""
+        outermost = getattr(self._batch, 'commands', None) is None
+        if outermost:
+            self._batch.commands = bytearray()
+        try:
+            yield
+        finally:
+            if outermost:
+                commands = self._batch.commands
+                self._batch.commands = None
+                if commands:
+                    self._write_commands(bytes(commands))
+
+    def invalidate_cache(self):
+        """Discards all cached variable values, they will be read again from the device on the next access.
+        Call this if the device state may have changed otherwise than through this object."""
+        self._cache.clear()
+
+    def _write_commands(self, commands: bytes) -> None:
+        """Sends commands to the device, for which no response is expected.
+
+        :param commands: bytes
+            The commands, as encoded ascii text."""
+        with self._thread_lock:
+            try:
+                buf = self.flush_buffer_in()
+                if buf:
+                    self.logger(f"{self.complete_name} received unexpected data: '{buf}'", error=True)
+                self._serial_iface.write(commands)
+            except (serial.SerialException, ValueError) as e:
+                self.logger(str(e))
+                self.logger(f"{self.complete_name}: failed to write variables", error=True)
+
     def open(self, comport: str) -> None:
         """Connects to the device. The connection must open before data can be sent or received.
 
         :param comport: str
             Identifier of the serial port to which the device is connected."""
         self.close()
+        self.invalidate_cache()
         with self._thread_lock:
             self._serial_iface.port = comport
             try:
@@ -223,11 +365,32 @@ class Arduino(MonitorDevice):
                 # which seems to have no other solution than waiting for the reset to complete (or preventing the
                 # reset line from activating, but this prevents writing to program memory).
                 sleep(2)
+                self._set_low_latency()
+                self._start_reading()
                 self.logger(f"Connected to {self.complete_name} on {self._serial_iface.port}.")
             except (serial.SerialException, ValueError) as e:
                 self.logger(str(e))
                 self.logger(f"Failed to connect to {self.complete_name} on {self._serial_iface.port}.", error=True)
 
+    def _set_low_latency(self):
+        """Asks the serial driver to deliver received data immediately, instead of waiting for the USB adapter
+        latency timer (16 ms by default on FTDI adapters) which otherwise delays every response.
+        Only supported by pyserial on Linux, elsewhere (or if the driver refuses) the port is left unchanged."""
+        try:
+            if hasattr(self._serial_iface, 'set_low_latency_mode'):
+                self._serial_iface.set_low_latency_mode(True)
+        except (AttributeError, ValueError, OSError) as e:
+            self.logger(f"{self.complete_name}: could not enable low latency mode ({e}).")
+
+    @property
+    def response_timeout(self) -> float:
+        """Time [s] to wait for the device to respond."""
+        return self._serial_iface.timeout
+
+    @response_timeout.setter
+    def response_timeout(self, timeout: float):
+        self._serial_iface.timeout = timeout
+
     def is_open(self) -> bool:
         """Check whether the connection is open.
 
@@ -237,6 +400,7 @@ class Arduino(MonitorDevice):
 
     def close(self) -> None:
         """Disconnects the device."""
+        self._stop_reading()
         try:
             if self._serial_iface.is_open:
                 with self._thread_lock:
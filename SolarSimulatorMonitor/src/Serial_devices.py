@@ -10,6 +10,8 @@ import serial.tools.list_ports
 import os.path
 from os import getcwd
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import Serial_Arduino
 
@@ -34,26 +36,43 @@ class KnownDevices:
     def __init__(self):
         self.path_to_config = os.path.join(getcwd(), 'config', 'known_devices.json')
         self._known_devices = None  # Loads from known_devices.json
+        self._known_devices_mtime = None  # Modification time of the file when it was last loaded or saved.
         self._custom_id_cache = {}  # Stores custom_ids between searches to save time
+        self._name_cache = {}  # Results of _name_of by device identifiers, cleared when the known devices change.
+        self._index = None  # Known devices by identifiers, see _build_index.
+        self.custom_id_timeout = 0.2  # Time [s] to wait for a device to send its custom ID.
+        self.ports_cache_ttl = 1.0  # Time [s] during which the list of connected devices is reused, see _comports.
+        self._ports_cache = None
+        self._ports_cache_time = 0.0
 
     def load(self):
-        """Retrieves known devices list from file and stores it in this object."""
-        if os.path.isfile(self.path_to_config):
-            with open(self.path_to_config, 'r') as known_devices_file:
-                try:
-                    self._known_devices = json.load(known_devices_file)
-                except json.JSONDecodeError as e:
-                    print(e)
-                    print(f'Unable to open {self.path_to_config}.')
-                    self._known_devices = None
-        else:
+        """Retrieves known devices list from file and stores it in this object.
+        The file is only parsed again if it was modified since the last time it was loaded."""
+        try:
+            mtime = os.stat(self.path_to_config).st_mtime
+        except FileNotFoundError:
             self._known_devices = None
+            self._known_devices_mtime = None
+            self._known_devices_changed()
+            return
+        if mtime == self._known_devices_mtime and self._known_devices is not None:
+            return
+        with open(self.path_to_config, 'r') as known_devices_file:
+            try:
+                self._known_devices = json.load(known_devices_file)
+            except json.JSONDecodeError as e:
+                print(e)
+                print(f'Unable to open {self.path_to_config}.')
+                self._known_devices = None
+        self._known_devices_mtime = mtime
+        self._known_devices_changed()
 
     def save(self):
         """Overwrites the known devices list with data from this object."""
         if self._known_devices:
             with open(self.path_to_config, 'w') as known_devices_file:
                 json.dump(self._known_devices, known_devices_file, indent=4)
+            self._known_devices_mtime = os.stat(self.path_to_config).st_mtime
 
     def add(self, device_name, device_data):
         """Add a new device to the list of known devices in this object.
@@ -66,6 +85,7 @@ class KnownDevices:
         if isinstance(device_name, str):
             if not self._known_devices:
                 self._known_devices = {}
+            self._known_devices_changed()
             self._known_devices[device_name] = {}
             if device_data.serial_number:
                 self._known_devices[device_name]["serial_number"] = device_data.serial_number
@@ -91,48 +111,103 @@ class KnownDevices:
                 isinstance(custom_id, str) and
                 device_name in self._known_devices):
             self._known_devices[device_name]["custom_id"] = custom_id
+            self._known_devices_changed()
+
+    def _known_devices_changed(self):
+        """Clears the data derived from the known devices list, call whenever it is modified."""
+        self._name_cache = {}
+        self._index = None
+
+    def _build_index(self):
+        """Indexes the known devices for _name_of. Devices with serial_number, vid and pid are stored by these
+        identifiers, as (position, name) in a dict of lists; the others, which have to be compared one by one, as
+        (position, name) in a list."""
+        by_identifiers = {}
+        partial = []
+        for position, (name, known_device) in enumerate(self._known_devices.items()):
+            if all(key in known_device for key in ("serial_number", "vid", "pid")):
+                key = (known_device["serial_number"], known_device["vid"], known_device["pid"])
+                by_identifiers.setdefault(key, []).append((position, name))
+            else:
+                partial.append((position, name))
+        self._index = (by_identifiers, partial)
+
+    def invalidate(self):
+        """Forgets the cached list of connected devices and their custom IDs, so that the next search scans the serial
+        ports again. Call after connecting or disconnecting devices."""
+        self._ports_cache = None
+        self._custom_id_cache = {}
+        self._name_cache = {}
+
+    def _comports(self):
+        """Lists the connected serial devices. Scanning the ports is slow (especially on Windows), so the list is reused
+        for ports_cache_ttl seconds.
+
+        :return: list
+            Objects holding device data as returned by serial.tools.list_ports.comports()"""
+        now = time.monotonic()
+        if self._ports_cache is None or now - self._ports_cache_time >= self.ports_cache_ttl:
+            self._ports_cache = serial.tools.list_ports.comports()
+            self._ports_cache_time = now
+        return self._ports_cache
 
     def _read_custom_id(self, device_comport):
         """Attempts to read the custom ID from the serial device. Serial communication is opened and '?' is sent,
         the response is returned as the ID.
         Note: Attempts to use cached values for custom ids, if you want to force reading custom ids from devices,
-        prepend 'self._custom_id_cache = {}'
+        call invalidate() first.
 
         :param device_comport: str
             String representing the comport of the device.
         :return: str
             The ID provided by the device or None upon failure."""
-        if device_comport in self._custom_id_cache.keys():
+        if device_comport in self._custom_id_cache:
             return self._custom_id_cache[device_comport]
-        arduino_device = None
         try:
-            arduino_device = Serial_Arduino.Arduino()
-            arduino_device.open(device_comport)
-            arduino_device.flush_buffer_in()
-            return arduino_device.read_variable('ID')
+            with Serial_Arduino.Arduino() as arduino_device:
+                # The ID is a short response, a device which did not send it by now is not going to.
+                arduino_device.response_timeout = self.custom_id_timeout
+                arduino_device.open(device_comport)
+                arduino_device.flush_buffer_in()
+                custom_id = arduino_device.read_variable('ID')
+            # Failed reads are not cached, the device may still be starting up.
+            if custom_id:
+                self._custom_id_cache[device_comport] = custom_id
+            return custom_id
         except (ValueError, serial.SerialException) as e:
+            self._custom_id_cache.pop(device_comport, None)
             print(e)
-        finally:
-            if arduino_device and arduino_device.is_open():
-                arduino_device.close()
         return None
 
     @staticmethod
-    def _compare_device_parameter(device_data_parameter, known_device, known_device_parameter_key):
-        """Compares a single parameter of a device with that of a known device.
-
-        :param device_data_parameter: str or int
-            The parameter read from serial.tools.list_ports.comports()[n]
-        :param known_device: obj
-            The object storing the parameters of the known device to compare.
-        :param known_device_parameter_key: str
-            The key to the corresponding parameter for a device stored in memory.
-        :return: True if the parameters match, or are both not available."""
-        if known_device_parameter_key not in known_device.keys():
-            return not bool(device_data_parameter)
-        if device_data_parameter:
-            return device_data_parameter == known_device[known_device_parameter_key]
-        return False
+    def _compare_identifiers(device_data, known_device):
+        """Compares the identifiers reported by the operating system (all but the custom ID) of a connected device to
+        those of a known one. Identifiers the device does not specify only match if the known device does not
+        specify them either.
+
+        :param device_data: obj
+            Object holding device data as returned by serial.tools.list_ports.comports()[n]
+        :param known_device: dict
+            Dictionary of device data as stored in _known_devices.values()
+        :return: True is the identifiers match, False if not."""
+        # Only specified identifiers are stored (see add), missing ones are None on both sides.
+        return ((device_data.serial_number or None,
+                 device_data.vid or None,
+                 device_data.pid or None,
+                 device_data.manufacturer or None) ==
+                (known_device.get("serial_number"),
+                 known_device.get("vid"),
+                 known_device.get("pid"),
+                 known_device.get("manufacturer")))
+
+    @staticmethod
+    def _uses_custom_id(known_device):
+        """Lets you know whether a known device is identified by its custom ID.
+
+        :param known_device: dict
+            Dictionary of device data as stored in _known_devices.values()
+        :return: bool"""
+        return "serial_number" not in known_device and "custom_id" in known_device
 
     def _compare(self, device_data, known_device):
         """Compares a connected device to a known one.
@@ -143,23 +218,30 @@ class KnownDevices:
             Dictionary of device data as stored in _known_devices.values()
         :return: True is the devices match, False if not. Only available parameters are checked, so false positives
             can occur."""
-        if not self._compare_device_parameter(device_data.serial_number,
-                                              known_device, "serial_number"):
-            return False
-        if not self._compare_device_parameter(device_data.vid,
-                                              known_device, "vid"):
+        if not self._compare_identifiers(device_data, known_device):
             return False
-        if not self._compare_device_parameter(device_data.pid,
-                                              known_device, "pid"):
-            return False
-        if not self._compare_device_parameter(device_data.manufacturer,
-                                              known_device, "manufacturer"):
-            return False
-        if ("serial_number" not in known_device.keys() and
-                "custom_id" in known_device.keys()):
+        if self._uses_custom_id(known_device):
             return known_device["custom_id"] == self._read_custom_id(device_data.device)
         return True
 
+    def _prefetch_custom_ids(self, connected_devices, known_devices):
+        """Reads the custom IDs that comparing the connected devices to the known ones will need, from all ports at
+        the same time. Each read waits for the device to reset, so reading them one by one adds up.
+
+        :param connected_devices: list
+            Objects holding device data as returned by serial.tools.list_ports.comports()
+        :param known_devices: list
+            Dictionaries of device data as stored in _known_devices.values()"""
+        known_devices = [known_device for known_device in known_devices if self._uses_custom_id(known_device)]
+        # Only ports which match a known device on everything else are opened, as in _compare.
+        comports = [device_data.device for device_data in connected_devices
+                    if device_data.device not in self._custom_id_cache and
+                    any(self._compare_identifiers(device_data, known_device) for known_device in known_devices)]
+        if len(comports) > 1:
+            with ThreadPoolExecutor(max_workers=min(8, len(comports))) as executor:
+                # Results are stored in _custom_id_cache.
+                list(executor.map(self._read_custom_id, comports))
+
     def _name_of(self, device_data):
         """Searches the known devices list for a match with the device data given.
 
@@ -167,11 +249,24 @@ class KnownDevices:
             Object holding device data as returned by serial.tools.list_ports.comports()[n]
         :return: str The name of the matching device or None if none is found."""
         if self._known_devices:
+            key = (device_data.serial_number, device_data.vid, device_data.pid, device_data.manufacturer,
+                   device_data.device)
+            if key in self._name_cache:
+                return self._name_cache[key]
+            if self._index is None:
+                self._build_index()
+            by_identifiers, partial = self._index
+            # Only the devices with the same identifiers, or lacking some, can match. The first match in the known
+            # devices list is returned.
+            candidates = by_identifiers.get((device_data.serial_number, device_data.vid, device_data.pid), [])
+            if partial:
+                candidates = sorted(candidates + partial)
             matching_device_name = None
-            for name in self._known_devices.keys():
+            for _, name in candidates:
                 if self._compare(device_data, self._known_devices[name]):
                     matching_device_name = name
                     break
+            self._name_cache[key] = matching_device_name
             return matching_device_name
         return None
 
@@ -188,8 +283,9 @@ class KnownDevices:
             self.load()
             if not self._known_devices:
                 raise KeyError('The list of known devices is empty.')
-        connected_devices = serial.tools.list_ports.comports()
-        if device_name in self._known_devices.keys():
+        connected_devices = self._comports()
+        if device_name in self._known_devices:
+            self._prefetch_custom_ids(connected_devices, [self._known_devices[device_name]])
             for connected_device in connected_devices:
                 if self._compare(connected_device, self._known_devices[device_name]):
                     return connected_device.device
@@ -209,9 +305,12 @@ class KnownDevices:
     def interactive_serial_scan(self):
         """Scans serial devices and allows to memorize unknown devices interactively via the command line."""
         self.load()
-        connected_devices = [{"data": data, "known": False, "name": ""} for data in serial.tools.list_ports.comports()]
+        self.invalidate()
+        connected_devices = [{"data": data, "known": False, "name": ""} for data in self._comports()]
         # Search known devices
-        self._custom_id_cache = {}
+        if self._known_devices:
+            self._prefetch_custom_ids([connected_device["data"] for connected_device in connected_devices],
+                                      self._known_devices.values())
         for connected_device in connected_devices:
             name = self._name_of(connected_device["data"])
             if name:
@@ -241,13 +340,14 @@ class KnownDevices:
                 device_name = input("Name: ")
                 if connected_devices[device_index]["known"]:
                     self._known_devices[device_name] = self._known_devices.pop(connected_devices[device_index]["name"])
+                    self._known_devices_changed()
                     connected_devices[device_index]["name"] = device_name
                 else:
                     self.add(device_name, connected_devices[device_index]["data"])
                     connected_devices[device_index]["known"] = True
                     connected_devices[device_index]["name"] = device_name
-                if ('serial_number' not in self._known_devices[device_name].keys() and
-                        'custom_id' not in self._known_devices[device_name].keys()):
+                if ('serial_number' not in self._known_devices[device_name] and
+                        'custom_id' not in self._known_devices[device_name]):
                     user_prompt = input("This device has no serial number, do you wish to add a custom ID?\n"
                                         "Use this option only if a custom ID was programmed into the device. (y/n):")
                     if user_prompt in ('y', 'yes'):
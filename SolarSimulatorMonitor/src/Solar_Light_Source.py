@@ -48,6 +48,10 @@ class SolarLightSource(Arduino):
                           'rw',
                           'int',
                           'Light intensity [%]')
+        # Besides writes (which discard the cached value), only the physical buttons change these: a reading up to
+        # 0.5 s old is recent enough.
+        self._cache_ttl['light_on'] = 0.5
+        self._cache_ttl['intensity'] = 0.5
 
     def write_sp(self, intensity) -> None:
         """Sends a command to change the light intensity. Intensity is expressed as integer percentage.
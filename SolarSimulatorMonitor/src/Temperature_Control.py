@@ -6,12 +6,16 @@ Description: Wrapper for the Omron E5_C temperature control unit.
     Provides an interface with a similar feel to the other devices of Solar Simulator.
 """
 
+import queue
+import time
+
 import pymodbus.exceptions
 
 import e5_cregister
+from concurrent.futures import Future
 from mapped_modbus_client import MappedModbusClient
 from e5_cregister import E5CRegisters
-from threading import Lock
+from threading import Lock, Thread
 from Common_Device import MonitorDevice
 
 
@@ -37,6 +41,17 @@ class TemperatureControl(MonitorDevice):
 
         self._thread_lock = Lock()  # Threading lock required to access the serial interface.
 
+        # Register values read from the device as (value, expiry time) by register name, only for the registers
+        # listed in _cache_ttl with their time to live [s]. Any write or command discards all cached values.
+        self._cache = {}
+        self._cache_ttl = {
+            'status': 0.1,  # Read by both read_onoff and is_autotune_running.
+        }
+
+        # While connected, a single thread performs all requests to the device, see _submit.
+        self._inbox = queue.Queue()
+        self._thread_io = None
+
     def __del__(self):
         self.close()
 
@@ -55,6 +70,7 @@ class TemperatureControl(MonitorDevice):
 
         :param comport: str
             Identifier of the serial port to which the device is connected."""
+        self.invalidate_cache()
         with self._thread_lock:
             try:
                 self._modbus_client = MappedModbusClient(port=comport, registers=E5CRegisters, slave=1)
@@ -69,6 +85,7 @@ class TemperatureControl(MonitorDevice):
                     # If another input type is used, make sure to check the decimal point position.
                     # print(self._modbus_client.read_register('decimal point monitor')[1])
                     self._modbus_client.write_register('pid_on_off', 'PID_CONTROL')
+                    self._start_io()
                     self.logger(f"Connected to {self.complete_name} on {comport}.")
             except pymodbus.exceptions.ModbusIOException as e:
                 self.logger(f"Could not connect to {self.complete_name} on {comport} due to an error (continues).",
@@ -88,15 +105,148 @@ class TemperatureControl(MonitorDevice):
 
     def close(self):
         """Disconnects the device."""
+        self._stop_io()
         with self._thread_lock:
             if self._modbus_client:
                 self._modbus_client.write_command('save_ram_data')
                 self._modbus_client.disconnect()
 
+    def _start_io(self):
+        """Starts the thread which performs all requests to the device."""
+        self._inbox = queue.Queue()
+        self._thread_io = Thread(target=self._io_loop)
+        self._thread_io.name = f"{self.complete_name} I/O thread"
+        self._thread_io.daemon = True
+        self._thread_io.start()
+
+    def _stop_io(self):
+        """Stops the I/O thread after it performs the requests already queued."""
+        if self._thread_io:
+            self._inbox.put(None)
+            self._thread_io.join()
+            self._thread_io = None
+
+    def _submit(self, kind: str, payload) -> Future:
+        """Queues a request for the I/O thread.
+
+        :param kind: str
+            'read' (payload: tuple of register names), 'write' (payload: (register name, value) tuple) or 'command'
+            (payload: (command, mode) tuple).
+        :param payload:
+            The request data, see kind.
+        :return: Future
+            Resolves to the list of values read for 'read', None otherwise."""
+        future = Future()
+        self._inbox.put((kind, payload, future))
+        return future
+
+    def _request(self, kind: str, payload):
+        """Performs a request in the I/O thread and waits for its result, see _submit.
+
+        :return:
+            The result of the request, or None if the device is not connected."""
+        if self._thread_io is None:
+            self.logger(f"{self.complete_name} cannot perform request: device is not connected.", error=True)
+            return None
+        if kind != 'read':
+            # Writes and commands may change any register, e.g. the status.
+            self.invalidate_cache()
+        return self._submit(kind, payload).result()
+
+    def invalidate_cache(self):
+        """Discards all cached register values, they will be read again from the device on the next access."""
+        self._cache.clear()
+
+    def _io_loop(self):
+        """Target for the I/O thread, performs queued requests until a None request is received. All requests waiting
+        in the queue are performed together, consecutive reads as few Modbus requests as possible."""
+        running = True
+        while running:
+            requests = [self._inbox.get()]
+            while True:
+                try:
+                    requests.append(self._inbox.get_nowait())
+                except queue.Empty:
+                    break
+            if None in requests:
+                running = False
+                requests = requests[:requests.index(None)]
+            with self._thread_lock:
+                self._process_requests(requests)
+        # Anything queued after the stop request cannot be performed anymore.
+        while True:
+            try:
+                request = self._inbox.get_nowait()
+            except queue.Empty:
+                break
+            if request:
+                request[2].set_exception(ConnectionError(f"{self.complete_name} was disconnected."))
+
+    def _process_requests(self, requests: list):
+        """Performs a list of requests in order, the caller must hold self._thread_lock.
+
+        :param requests: list
+            Requests as queued by _submit."""
+        reads = []
+        for kind, payload, future in requests:
+            if kind == 'read':
+                reads.append((payload, future))
+                continue
+            self._perform_reads(reads)
+            reads = []
+            try:
+                if kind == 'write':
+                    self._modbus_client.write_register(*payload)
+                else:
+                    self._modbus_client.write_command(*payload)
+                future.set_result(None)
+            except Exception as e:
+                future.set_exception(e)
+        self._perform_reads(reads)
+
+    def _perform_reads(self, reads: list):
+        """Performs read requests together (contiguous registers are read with a single Modbus request), the caller
+        must hold self._thread_lock.
+
+        :param reads: list
+            (register names, future) tuples from the 'read' requests queued by _submit."""
+        if not reads:
+            return
+        names = [name for payload, future in reads for name in payload]
+        try:
+            values = [register[1] for register in self._modbus_client.read_registers(names)]
+        except Exception as e:
+            for payload, future in reads:
+                future.set_exception(e)
+            return
+        index = 0
+        for payload, future in reads:
+            future.set_result(values[index:index + len(payload)])
+            index += len(payload)
+
+    def _read_registers(self, *names: str) -> list:
+        """Reads registers from the device.
+
+        :param names: str
+            The names of the registers, see e5_cregister.E5CRegisters.
+        :return: list
+            The values of the registers, None for each if the device is not connected."""
+        now = time.monotonic()
+        cached = [self._cache.get(name, (None, 0.0)) for name in names]
+        if all(now < expiry for value, expiry in cached):
+            return [value for value, expiry in cached]
+        values = self._request('read', names)
+        if values is None:
+            return [None] * len(names)
+        for name, value in zip(names, values):
+            ttl = self._cache_ttl.get(name, 0.0)
+            if ttl > 0.0 and value is not None:
+                self._cache[name] = (value, now + ttl)
+        return values
+
     def read_status(self) -> e5_cregister.E5CStatus:
         """Reads the device status registers."""
-        with self._thread_lock:
-            return self._modbus_client.read_register('status')[1]
+        return self._read_registers('status')[0]
 
     def write_onoff(self, on: bool):
         """Write a command to the device to enable heating.
@@ -106,9 +256,7 @@ class TemperatureControl(MonitorDevice):
         cmd = 'STOP'
         if on:
             cmd = 'RUN'
-        with self._thread_lock:
-            if self._modbus_client:
-                self._modbus_client.write_command('run_stop', cmd)
+        self._request('command', ('run_stop', cmd))
 
     def read_onoff(self) -> bool:
         """Read whether heating is enabled or not.
@@ -122,38 +270,33 @@ class TemperatureControl(MonitorDevice):
 
         :param temperature: float
             The desired temperature in °C."""
-        with self._thread_lock:
-            self._modbus_client.write_register('sp', temperature)
+        self._request('write', ('sp', temperature))
 
     def read_pv(self) -> float:
         """Reads the current reactor temperature.
 
         :return: float
             The temperature in °C."""
-        with self._thread_lock:
-            return self._modbus_client.read_register('pv')[1]
+        return self._read_registers('pv')[0]
 
     def read_sp(self) -> float:
         """Reads the current target reactor temperature.
 
         :return: float
             The target temperature in °C."""
-        with self._thread_lock:
-            return self._modbus_client.read_register('sp')[1]
+        return self._read_registers('sp')[0]
 
     def read_heating_power(self) -> float:
         """Reads the current applied heating.
 
         :return: float
             Heating power as %."""
-        with self._thread_lock:
-            return self._modbus_client.read_register('mvmonheat')[1]
+        return self._read_registers('mvmonheat')[0]
 
     def start_autotune(self):
         """Starts the autotune AT100%"""
-        with self._thread_lock:
-            # self._modbus_client.write_command('software_reset')
-            self._modbus_client.write_command('at_exec_cancel', 'AT_EXEC_100PCT')
+        # self._modbus_client.write_command('software_reset')
+        self._request('command', ('at_exec_cancel', 'AT_EXEC_100PCT'))
 
     def is_autotune_running(self) -> bool:
         """Checks whether autotune is running.
@@ -164,13 +307,10 @@ class TemperatureControl(MonitorDevice):
 
     def read_pid(self):
         """Reads the PID values."""
-        with self._thread_lock:
-            pid_p = self._modbus_client.read_register('pid_p')[1]
-            pid_i = self._modbus_client.read_register('pid_i')[1]
-            pid_d = self._modbus_client.read_register('pid_d')[1]
-            return {'P': pid_p, 'I': pid_i, 'D': pid_d}
+        # The PID registers are contiguous, they are read with a single request.
+        pid_p, pid_i, pid_d = self._read_registers('pid_p', 'pid_i', 'pid_d')
+        return {'P': pid_p, 'I': pid_i, 'D': pid_d}
 
     def save_ram_data(self):
         """Saves the current data from RAM to non-volatile device memory."""
-        with self._thread_lock:
-            self._modbus_client.write_command('save_ram_data')
+        self._request('command', ('save_ram_data',))
@@ -4,10 +4,10 @@ Author: Author: Ronald Kortekaas - University of Amsterdam (TC) - 2023
 Description: Modbus interface for the Omron E5_C temperature controller.
 """
 
-import struct
 import enum
+import functools
 from enum import Enum, EnumType
-from typing import Any, Type
+from typing import Any, Callable, Type
 # from pymodbus import pymodbus_apply_logging_config
 from pymodbus.client import ModbusSerialClient
 from pymodbus.exceptions import ParameterException
@@ -19,6 +19,9 @@ from pymodbus.pdu import ModbusResponse
 # Enable debugging
 # pymodbus_apply_logging_config('DEBUG')
 
+# Maximum number of registers read by a single request (Modbus specification).
+MAX_READ_COUNT = 125
+
 
 class DataSize(Enum):
     BYTE = 8
@@ -33,30 +36,31 @@ class StructSizeUnsigned(Enum):
 
 
 class MappedModbusRegisters:
-    __registers = {}
-
-    @classmethod
-    @property
-    def registers(cls):
-        return cls.__registers
+    # Register map by name, defined by subclasses.
+    registers = {}
 
     @classmethod
     def get_info(cls, name: str):
         return cls.registers[name]  # pylint: disable=unsubscriptable-object
 
+    # The register map does not change, the names are listed once per class.
+
     @classmethod
+    @functools.cache
     def list_names(cls):
-        return list(cls.registers.keys())
+        return tuple(cls.registers.keys())
 
     @classmethod
+    @functools.cache
     def list_holding_names(cls):
-        return list(k for k, v in cls.registers.items()
-                    if 'holding' in v['register_type'])
+        return tuple(k for k, v in cls.registers.items()
+                     if 'holding' in v['register_type'])
 
     @classmethod
+    @functools.cache
     def list_commands(cls):
-        return list(k for k, v in cls.registers.items()
-                    if 'command' in v['register_type'])
+        return tuple(k for k, v in cls.registers.items()
+                     if 'command' in v['register_type'])
 
     @classmethod
     def list_commands_actions(cls):
@@ -83,11 +87,13 @@ class MappedModbusClient:
             registers: object,
             framer: Type[ModbusFramer] = ModbusRtuFramer,
             baudrate: int = 9200,
-            timeout: int = 10,
+            timeout: float = 1.0,
             bytesize: int = 8,
             parity: str = 'E',
             stopbits: int = 1,
             slave: int = 0,
+            retries: int = 3,
+            strict: bool = False,
             ) -> None:
         self.registers = registers
         self.slave = slave
@@ -99,16 +105,31 @@ class MappedModbusClient:
                 timeout=timeout,
                 parity=parity,
                 stopbits=stopbits,
-                bytesize=bytesize
+                bytesize=bytesize,
+                # A failed request is retried after timeout [s], instead of
+                # stalling the poll cycle. Strict inter-character timing is
+                # unreliable over USB-serial adapters.
+                retries=retries,
+                strict=strict
                 )
 
         self.logger = MappedModbusClient.default_logger
 
+        # Functions converting the words read to values, by register name.
+        self._decoders = {}
+        # Requests and conversions for read_registers, by tuple of names.
+        self._read_plans = {}
+        # Values written by write_command, by (command, mode).
+        self._command_words = {}
+        # (words, value) last read by read_registers, by register name.
+        self._last_read = {}
+
     @staticmethod
     def default_logger(message, error=False):
         print(message)
 
     def connect(self) -> bool:
+        self._last_read = {}
         self.connected = self.client.connect()
         return self.connected
 
@@ -116,17 +137,21 @@ class MappedModbusClient:
         self.client.close()
 
     def _hton(self, words: list, insize: int, outsize: int) -> int:
-        val = [0] * (insize - len(words)) + words
-        val = struct.pack(f"<{len(val)}{StructSizeUnsigned(insize).name}",
-                          *val)
-        val = struct.unpack(f">{StructSizeUnsigned(outsize*2).name}", val)[0]
+        # Same result as packing the words little endian and unpacking them
+        # big endian, computed with shifts (no format strings or buffers).
+        val = 0
+        for word in [0] * (insize - len(words)) + words:
+            if insize > 1:
+                word = int.from_bytes(word.to_bytes(insize, 'little'), 'big')
+            val = (val << (8 * insize)) | word
         return val
 
     def _ntoh(self, words: list, insize: int, outsize: int) -> int:
-        val = [0] * (insize - len(words)) + words
-        val = struct.pack(f"<{len(val)}{StructSizeUnsigned(insize).name}",
-                          *val)
-        val = struct.unpack(f"<{StructSizeUnsigned(outsize*2).name}", val)[0]
+        # Same result as packing and unpacking the words little endian: the
+        # first word is the least significant.
+        val = 0
+        for index, word in enumerate([0] * (insize - len(words)) + words):
+            val |= word << (8 * insize * index)
         return val
 
     def _read(self,
@@ -139,47 +164,83 @@ class MappedModbusClient:
                                                       slave=self.slave)
         return None
 
-    def _read_register(self, register: dict) -> Any:
-        val = None
+    @staticmethod
+    def _read_count(register: dict) -> int:
+        if 'enum' in register['data_format']:
+            return 1
+        return register['data_length']
+
+    def _decoder(self, name: str) -> Callable[[list], Any]:
+        # Decoders are made once per register, see _make_decoder.
+        decoder = self._decoders.get(name)
+        if decoder is None:
+            decoder = self._make_decoder(self.registers.get_info(name))
+            self._decoders[name] = decoder
+        return decoder
+
+    def _make_decoder(self, register: dict) -> Callable[[list], Any]:
+        """Makes the function converting the words read from a register to
+        its value, the register format is only looked up here.
+
+        Args:
+            register (dict): Register information
 
-        if 'int' in register['data_format']:
-            if register['data_length'] == 1:
-                val = self._read(register['register_type'],
-                                 register['address'])
+        Returns:
+            Callable: takes the list of words read, returns the value
+        """
+        data_format = register['data_format']
 
+        if 'int' in data_format:
+            si_adj = register['si_adj']
             if register['data_length'] == 2:
-                val = self._read(register['register_type'],
-                                 register['address'],
-                                 register['data_length'])
-                val = self._ntoh(val.registers,
-                                 register['data_length'], 1)
-                val = register['data'](val)
-            val = val.registers[0] / register['si_adj']
-        elif 'bit' in register['data_format']:
-            if register['data_length'] == 1:
-                val = self._read(register['register_type'],
-                                 register['address'])
-
-            val = bin(val.registers[0])
-        elif 'enum' in register['data_format']:
-            val = self._read(register['register_type'],
-                             register['address'])
-            val = register['data'](val.registers[0]).name
-
-        elif 'flag' in register['data_format']:
-            try:
-                val = self._read(register['register_type'],
-                                 register['address'],
-                                 register['data_length'])
-                val = self._ntoh(val.registers,
-                                 2,
-                                 register['data_length'])
-                val = register['data'](val)
-            except ValueError as e:
-                self.logger('Invalid flag received', True)
-                self.logger(str(e), True)
+                # Two words, the first is the most significant.
+                if register.get('signed', False):
+                    def decode(words):
+                        val = words[0] << 16 | words[1]
+                        if val & 0x80000000:
+                            val -= 0x100000000
+                        return val / si_adj
+                    return decode
+                return lambda words: (words[0] << 16 | words[1]) / si_adj
+            if register.get('signed', False):
+                def decode(words):
+                    val = words[0]
+                    if val & 0x8000:
+                        val -= 0x10000
+                    return val / si_adj
+                return decode
+            return lambda words: words[0] / si_adj
+        elif 'bit' in data_format:
+            # The bits as an integer, test them with masks (not a string).
+            return lambda words: words[0]
+        elif 'enum' in data_format:
+            data = register['data']
+            names = {member.value: member.name for member in data}
+            # Values outside the enum go through it to raise its usual error.
+            return lambda words: names.get(words[0]) or data(words[0]).name
+
+        elif 'flag' in data_format:
+            data = register['data']
+            data_length = register['data_length']
+            if data_length == 4:
+                # Same as _ntoh(words, 2, 4), as used by the status register.
+                def to_int(words):
+                    return (words[0] | words[1] << 16
+                            | words[2] << 32 | words[3] << 48)
+            else:
+                def to_int(words):
+                    return self._ntoh(words, 2, data_length)
 
-        return val
+            def decode(words):
+                try:
+                    return data(to_int(words))
+                except ValueError as e:
+                    self.logger('Invalid flag received', error=True)
+                    self.logger(str(e), error=True)
+                return None
+            return decode
+
+        return lambda words: None
 
     def read_register(self, name: str) -> tuple:
         """Read a register from the modbus client
@@ -190,22 +251,108 @@ class MappedModbusClient:
         Returns:
             tuple: (description, value, data_unit)
         """
-        register = self.registers.get_info(name)
+        # The read plan already holds the decoder, description and unit.
+        return self.read_registers((name,))[0]
+
+    def _group_registers(self, names: list) -> list:
+        """Groups registers into runs of contiguous addresses, each of which
+        can be read with a single request. Addresses between runs may not be
+        readable, so they are never included in a request.
+
+        Args:
+            names (list): Register names
+
+        Returns:
+            list: (register_type, start, count, names) for each run
+        """
+        spans = sorted((register['register_type'],
+                        register['address'],
+                        register['address'] + self._read_count(register),
+                        name)
+                       for name, register
+                       in ((name, self.registers.get_info(name))
+                           for name in names))
+        groups = []
+        for register_type, address, end, name in spans:
+            if groups:
+                group = groups[-1]
+                if (register_type == group[0] and address <= group[2]
+                        and max(end, group[2]) - group[1] <= MAX_READ_COUNT):
+                    group[2] = max(end, group[2])
+                    group[3].append(name)
+                    continue
+            groups.append([register_type, address, end, [name]])
+        return [(register_type, start, end - start, group_names)
+                for register_type, start, end, group_names in groups]
+
+    def _read_plan(self, names: list) -> tuple:
+        """Prepares the requests and conversions needed to read a list of
+        registers, once per list of names (callers read the same lists over
+        and over).
+
+        Args:
+            names (list): Register names
 
-        value = self._read_register(register)
+        Returns:
+            tuple: (requests, labels) where requests are (register_type,
+                start, count, members) with members (name, first word, end
+                word, decoder) for each register in the request, and labels
+                are (name, description, data_unit) in the order of names
+        """
+        key = tuple(names)
+        plan = self._read_plans.get(key)
+        if plan is None:
+            requests = []
+            for register_type, start, count, group_names in \
+                    self._group_registers(key):
+                members = []
+                for name in group_names:
+                    register = self.registers.get_info(name)
+                    offset = register['address'] - start
+                    members.append((name,
+                                    offset,
+                                    offset + self._read_count(register),
+                                    self._decoder(name)))
+                requests.append((register_type, start, count, tuple(members)))
+            labels = []
+            for name in key:
+                register = self.registers.get_info(name)
+                labels.append((name,
+                               register['description'],
+                               register.get('data_unit', "")))
+            plan = (tuple(requests), tuple(labels))
+            self._read_plans[key] = plan
+        return plan
+
+    def read_registers(self, names: list) -> list:
+        """Read several registers from the modbus client. Registers with
+        contiguous addresses are read with a single request. Values are only
+        decoded again if the register changed since it was last read.
 
-        if 'data_unit' not in register:
-            return (register['description'], value, "")
+        Args:
+            names (list): Register names
 
-        return (register['description'], value, register['data_unit'])
+        Returns:
+            list: (description, value, data_unit) for each register
+        """
+        requests, labels = self._read_plan(names)
+        values = {}
+        for register_type, start, count, members in requests:
+            words = self._read(register_type, start, count).registers
+            for name, first, end, decoder in members:
+                raw = words[first:end]
+                last = self._last_read.get(name)
+                if last is not None and last[0] == raw:
+                    values[name] = last[1]
+                else:
+                    values[name] = decoder(raw)
+                    self._last_read[name] = (raw, values[name])
+        return [(description, values[name], data_unit)
+                for name, description, data_unit in labels]
 
     def read_all_registers(self) -> list:
         """Read all registers from the modbus client."""
-        value_list = []
-
-        for item in self.registers.list_holding_names():
-            value_list.append(self.read_register(item))
-        return value_list
+        return self.read_registers(self.registers.list_holding_names())
 
     def write_register(self, name: str, value: Any) -> None:
         """Writes a register to the modbus client.
@@ -224,6 +371,20 @@ class MappedModbusClient:
                                     values=val,
                                     slave=self.slave)
 
+    def _command_word(self, command: str, mode: str) -> int:
+        register = self.registers.get_info(command)
+        if 'action' in register['register_type']:
+            if not mode:
+                return self._hton([register['command_code'],
+                                   register['data']],
+                                  1, 1)
+            raise ParameterException(mode)
+        if mode in register['data'].__members__:
+            return self._hton([register['command_code'],
+                               register['data'][mode].value],
+                              1, 1)
+        raise ParameterException(mode)
+
     def write_command(self, command: str, mode: str = '') -> None:
         """Writes a command to the modbus client.
 
@@ -231,25 +392,15 @@ class MappedModbusClient:
             command (str): Command to write
             mode (str): Command mode
         """
-        register = self.registers.get_info(command)
-        if 'action' in register['register_type']:
-            if not mode:
-                val = self._hton([register['command_code'],
-                                  register['data']],
-                                 1, 1)
-            else:
-                raise ParameterException(mode)
-        else:
-            if mode in register['data'].__members__:
-                val = self._hton([register['command_code'],
-                                  register['data'][mode].value],
-                                 1, 1)
-            else:
-                raise ParameterException(mode)
+        val = self._command_words.get((command, mode))
+        if val is None:
+            val = self._command_word(command, mode)
+            self._command_words[(command, mode)] = val
         res = self.client.write_register(address=0x0000,
                                          value=val,
                                          slave=self.slave)
         if res.isError():
+            register = self.registers.get_info(command)
             self.logger('Error: '+str(register)+str(command)+str(mode), error=True)
             self.logger(str(res), error=True)
             if hasattr(res, 'registers'):